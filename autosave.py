@@ -0,0 +1,225 @@
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+
+AUTOSAVE_INTERVAL = 30000  # ms between autosaves at a moderate typing rate
+AUTOSAVE_MIN_INTERVAL = 5000
+AUTOSAVE_MAX_INTERVAL = 60000
+SAVE_POLL_MS = 20  # How often the Tk thread shows the progress of a save on the writer
+
+
+def atomic_write(path, content, encoding="utf-8"):
+    """Write content to path via a temporary file in the same directory, fsync and rename.
+
+    A crash in the middle of the write leaves the previous file intact.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".natatnik-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding=encoding) as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def content_hash(content):
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+
+def next_interval(interval, edits):
+    """Return the next autosave interval given the number of edits made during the last one."""
+    if not edits:
+        return min(interval * 2, AUTOSAVE_MAX_INTERVAL)
+    # Save more often the faster the user types: 100 edits per interval keep it at half the default
+    return max(AUTOSAVE_MIN_INTERVAL, min(AUTOSAVE_MAX_INTERVAL, AUTOSAVE_INTERVAL * 100 // (100 + edits)))
+
+
+class BackgroundWriter(threading.Thread):
+    """Worker thread that runs disk jobs in submission order, away from the Tk thread."""
+
+    def __init__(self, name="natatnik-writer"):
+        super().__init__(name=name, daemon=True)
+        self.jobs = queue.Queue()
+        self.writing = {}  # Path -> number of submitted jobs writing it that have not finished
+        self.writing_changed = threading.Condition()
+        self.start()
+
+    def submit(self, func, *args, path=None):
+        """Queue func(*args); path names the file the job writes, for wait_for()."""
+        if path is not None:
+            path = os.path.abspath(path)
+            with self.writing_changed:
+                self.writing[path] = self.writing.get(path, 0) + 1
+        self.jobs.put((func, args, path))
+
+    def wait(self):
+        """Block until every submitted job has finished."""
+        self.jobs.join()
+
+    def wait_for(self, path):
+        """Block until the submitted jobs writing path have finished, not the other ones."""
+        path = os.path.abspath(path)
+        with self.writing_changed:
+            while self.writing.get(path):
+                self.writing_changed.wait()
+
+    def run(self):
+        while True:
+            func, args, path = self.jobs.get()
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"Error in background job {getattr(func, '__name__', func)}: {e}")
+            finally:
+                if path is not None:
+                    with self.writing_changed:
+                        self.writing[path] -= 1
+                        if not self.writing[path]:
+                            del self.writing[path]
+                        self.writing_changed.notify_all()
+                self.jobs.task_done()
+
+
+class RequestWorker(BackgroundWriter):
+    """Worker thread whose jobs return a result, handed to a callback on the Tk thread."""
+
+    def __init__(self, root, name):
+        self.root = root
+        self.results = queue.Queue()
+        self.waiting = 0
+        super().__init__(name)
+
+    def request(self, callback, func, *args):
+        """Run func(*args) on the worker thread and pass its result to callback on the Tk thread."""
+        self.waiting += 1
+        if self.waiting == 1:
+            self.root.after(50, self._poll_results)
+        self.submit(self._run_request, callback, func, args)
+
+    def _run_request(self, callback, func, args):
+        result = None
+        try:
+            result = func(*args)
+        finally:
+            self.results.put((callback, func, result))  # Hand back even on failure so polling stops
+
+    def _poll_results(self):
+        while True:
+            try:
+                callback, func, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.waiting -= 1
+            try:
+                callback(result)
+            except Exception as e:
+                print(f"Error handling result of {getattr(func, '__name__', func)}: {e}")
+        if self.waiting > 0:
+            self.root.after(50, self._poll_results)
+
+
+def commit_temp_file(f, tmp_path, path):
+    """Make a fully written temporary file durable and move it over path."""
+    try:
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        f.close()
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class StreamingSave:
+    """Writes the content of a TextWidget to a file on the background writer.
+
+    The Tk thread only takes a snapshot of the widget's document mirror; its
+    slices are immutable strings, so one writer job encodes them chunk by
+    chunk into a temporary file next to the target, fsyncs it and renames it
+    over the target, while editing goes on. Memory stays flat whatever the
+    size of the document. The Tk thread polls the job: on_progress gets the
+    characters written and the total, then on_done the content hash or
+    on_error the exception that stopped the save, once the file is in place.
+    """
+
+    def __init__(self, text_widget, path, writer, on_progress, on_done, on_error, encoding="utf-8"):
+        self.text_widget = text_widget
+        self.path = path
+        self.writer = writer
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.encoding = encoding
+        self.written = 0  # Characters written, updated by the writer job
+        self.total = 0
+        self.digest = None
+        self.job = None
+        self.finished = threading.Event()  # Set by the writer job once the file is in place or the save failed
+        self.error = None
+
+    def start(self, wait=False):
+        """Start saving; with wait the whole save, including the rename, is done before returning."""
+        document = self.text_widget.document
+        self.total = document.length
+        chunks = document.iter_chunks(document.snapshot())
+        # Queued behind earlier writes of the same file, so they cannot land after this one
+        self.writer.submit(self._write, chunks, path=self.path)
+        self._poll(wait)
+
+    def complete(self):
+        """Finish a save still in progress before returning."""
+        if self.job is not None:
+            self.text_widget.after_cancel(self.job)
+            self._poll(wait=True)
+
+    def _write(self, chunks):
+        # Writer job: the snapshot never changes, whatever is typed meanwhile
+        try:
+            directory = os.path.dirname(self.path) or "."
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".natatnik-", suffix=".tmp")
+            f = os.fdopen(fd, "wb")
+            try:
+                hasher = hashlib.blake2b(digest_size=16)  # Same digest as content_hash of the whole text
+                for text in chunks:
+                    data = text.encode(self.encoding)
+                    hasher.update(data)
+                    if os.linesep != "\n":
+                        data = text.replace("\n", os.linesep).encode(self.encoding)  # Like a text mode file
+                    f.write(data)
+                    self.written += len(text)
+            except BaseException:
+                f.close()
+                os.remove(tmp_path)
+                raise
+            commit_temp_file(f, tmp_path, self.path)
+            self.digest = hasher.digest()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished.set()
+
+    def _poll(self, wait=False):
+        self.job = None
+        if wait:
+            self.finished.wait()
+        elif not self.finished.is_set():
+            self.on_progress(self.written, max(self.total, 1))
+            self.job = self.text_widget.after(SAVE_POLL_MS, self._poll)
+            return
+        if self.error is not None:
+            self.on_error(self.error)
+        else:
+            self.on_done(self.digest)
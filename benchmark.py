@@ -0,0 +1,267 @@
+"""Latency benchmarks of the editor on generated documents.
+
+Drives a real TextEditor with synthetic key events, pastes, file opens, tab
+switches, font changes and autosaves, so it needs a display; on a headless
+machine run it under Xvfb:
+
+    xvfb-run -a python benchmark.py --output results.json --baseline benchmark_baseline.json
+
+Every document size runs in its own process with a scratch NATATNIK_HOME,
+so the peak memory reported for a size is that of the editor holding it.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+KB = 1024
+MB = 1024 * KB
+SIZES = [KB, 100 * KB, MB, 10 * MB, 50 * MB]
+LARGE = 10 * MB  # Documents from this size get fewer samples of the slow scenarios
+TOLERANCE = 1.25  # A p50 more than this many times the baseline counts as a regression
+WORDS = ("і", "не", "на", "што", "як", "але", "гэта", "было", "калі", "ён", "яна", "мова", "слова", "горад",
+         "вечар", "дарога", "сонца", "вада", "кніга", "чалавек", "беларуская", "рэдактар", "сям’я", "зямля",
+         "працаваць", "размаўляць", "адказаў", "пытанне", "сённяшні", "надвор’е")
+PASTE_CHARS = 10 * KB
+
+
+def generate_document(size, seed=0):
+    """Return about size characters of prose, one paragraph per line like the editor's documents."""
+    rng = random.Random(seed)
+    paragraphs = []
+    total = 0
+    while total < size:
+        sentences = []
+        for _ in range(rng.randint(1, 6)):
+            words = rng.choices(WORDS, k=rng.randint(4, 18))
+            sentences.append(" ".join(words).capitalize() + rng.choice(".!?"))
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 1
+    return "\n".join(paragraphs)[:size]
+
+
+def percentile(samples, fraction):
+    # Nearest rank, so p99 of few samples is their maximum
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(samples):
+    return {"p50_ms": round(percentile(samples, 0.5) * 1000, 3),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+            "samples": len(samples)}
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (MB if sys.platform == "darwin" else KB), 1)  # Bytes on macOS, KB elsewhere
+
+
+class Bench:
+    """One document size: an editor with the document open and the scenarios run against it."""
+
+    def __init__(self, size, home):
+        # The editor reads NATATNIK_HOME when main is imported
+        os.environ["NATATNIK_HOME"] = home
+        import tkinter as tk
+        import main
+        self.tk = tk
+        self.size = size
+        self.path = os.path.join(home, f"document-{size}.txt")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(generate_document(size))
+        self.root = tk.Tk()
+        self.root.geometry("1000x700")
+        self.editor = main.TextEditor(self.root)
+        self.settle()
+        self.other_tab = self.editor.current_file  # The untitled tab of an empty settings directory
+        self.tab_id = None
+        self.results = {}
+
+    def settle(self):
+        # Process pending events and idle work, including the redraws scheduled by the last action
+        self.root.update()
+        self.root.update_idletasks()
+
+    def wait_until_loaded(self, tab_id):
+        tab_info = self.editor.tabs[tab_id]
+        while tab_info["loader"] is not None or tab_info["journal"] is None:
+            self.root.update()
+            time.sleep(0.001)
+
+    def time(self, name, count, action, prepare=None):
+        samples = []
+        for i in range(count):
+            if prepare:
+                prepare(i)
+            start = time.perf_counter()
+            action(i)
+            samples.append(time.perf_counter() - start)
+        self.results[name] = summarize(samples)
+        self.settle()
+
+    def widget(self):
+        return self.editor.tabs[self.tab_id]["text_widget"]
+
+    def run(self):
+        few = 1 if self.size >= LARGE else 5
+        self.time("open", few, self.open, prepare=self.close)
+        widget = self.widget()
+        widget.mark_set(self.tk.INSERT, f"{int(widget.index('end').split('.')[0]) // 2}.0")
+        widget.see(self.tk.INSERT)
+        widget.focus_force()
+        self.settle()
+        self.time("keypress", 200, self.keypress)
+        widget.show_special = True
+        self.time("update_display", 50, lambda i: widget.update_display(), prepare=self.scroll)
+        widget.show_special = False
+        self.time("count_display_lines", 50, lambda i: self.editor.count_display_lines(), prepare=self.keypress)
+        self.root.clipboard_clear()
+        self.root.clipboard_append(generate_document(PASTE_CHARS, seed=1))
+        self.time("paste", 20, self.paste)
+        self.time("tab_switch", 20, self.switch_tab)
+        self.time("font_change", few * 2, self.change_font)
+        self.time("autosave", few * 2, self.autosave, prepare=self.keypress)
+        self.results["peak_rss_mb"] = peak_rss_mb()
+        return self.results
+
+    def open(self, i):
+        self.editor.open_path(self.path)
+        self.tab_id = self.editor.current_file
+        self.wait_until_loaded(self.tab_id)
+        self.settle()
+
+    def close(self, i):
+        if self.tab_id is not None:
+            self.editor.remove_tab(self.tab_id)
+            self.tab_id = None
+            self.settle()
+
+    def keypress(self, i):
+        # Latin letters are in the keymap of a bare Xvfb server, Cyrillic ones may not be
+        keysym = "space" if i % 6 == 5 else "abcdefghijklmnopqrst"[i % 20]
+        self.widget().event_generate("<KeyPress>", keysym=keysym)
+        self.widget().event_generate("<KeyRelease>", keysym=keysym)
+        self.root.update_idletasks()
+
+    def scroll(self, i):
+        widget = self.widget()
+        widget.yview_moveto(random.Random(i).random())
+        widget.decorated_lines.clear()  # Mark the whole viewport again
+        self.root.update_idletasks()
+
+    def paste(self, i):
+        self.editor.paste()
+        self.root.update_idletasks()
+
+    def switch_tab(self, i):
+        tab_id = self.other_tab if i % 2 == 0 else self.tab_id
+        self.editor.notebook.select(self.editor.tabs[tab_id]["frame"])
+        self.settle()
+
+    def change_font(self, i):
+        self.editor.on_font_size_change(20 if i % 2 == 0 else 28)
+        self.root.update_idletasks()
+
+    def autosave(self, i):
+        self.editor.autosave_tab(self.tab_id, wait=True)
+
+
+def run_size(size, output):
+    # Child process: benchmark one document size and write the results to output
+    with tempfile.TemporaryDirectory(prefix="natatnik-bench-") as home:
+        bench = Bench(size, home)
+        results = bench.run()
+        bench.editor.writer.wait()
+        bench.root.destroy()
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f)
+
+
+def size_name(size):
+    return f"{size // MB}MB" if size >= MB else f"{size // KB}KB"
+
+
+def compare(results, baseline, tolerance):
+    """Return a line for every p50 latency or peak memory above tolerance times the baseline."""
+    regressions = []
+    for size, scenarios in results["sizes"].items():
+        for name, current in scenarios.items():
+            before = baseline.get("sizes", {}).get(size, {}).get(name)
+            if isinstance(current, dict) and isinstance(before, dict):
+                current, before, unit = current["p50_ms"], before["p50_ms"], "ms p50"
+            elif isinstance(current, (int, float)) and isinstance(before, (int, float)):
+                unit = "MB"
+            else:
+                continue  # Not measured in one of the runs
+            if before and current / before > tolerance:
+                regressions.append(f"{size} {name}: {before} -> {current} {unit} ({current / before:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark typing, paste, load and save latencies.")
+    parser.add_argument("--sizes", type=lambda text: [int(float(size) * KB) for size in text.split(",")],
+                        default=SIZES, help="comma separated document sizes in KB")
+    parser.add_argument("--output", help="write the results as JSON to this file instead of stdout")
+    parser.add_argument("--baseline", help="compare with the results in this file, exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_size is not None:
+        run_size(args.run_size, args.result_file)
+        return 0
+
+    import tkinter
+    results = {"python": sys.version.split()[0], "tk": tkinter.TkVersion, "platform": sys.platform, "sizes": {}}
+    for size in args.sizes:
+        print(f"Benchmarking {size_name(size)}...", file=sys.stderr)
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            result_file = f.name
+        try:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--run-size", str(size),
+                            "--result-file", result_file], check=True, stdout=sys.stderr)
+            with open(result_file, "r", encoding="utf-8") as f:
+                results["sizes"][size_name(size)] = json.load(f)
+        except (subprocess.CalledProcessError, OSError, ValueError) as e:
+            print(f"Error benchmarking {size_name(size)}: {e}", file=sys.stderr)
+        finally:
+            os.remove(result_file)
+
+    report = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+    if args.baseline:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading baseline: {e}", file=sys.stderr)
+            return 2
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"Regression: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+import heapq
+import tkinter as tk
+from bisect import bisect_left
+from collections import Counter
+
+from autosave import RequestWorker
+from spellcheck import WORD_RE
+
+MIN_WORD_LENGTH = 4  # Shorter words are not worth completing
+MIN_PREFIX_LENGTH = 3  # Suggestions are offered from this many typed letters
+MAX_SUGGESTIONS = 8
+WORD_CONTEXT = 64  # Characters around an edit looked at for the words it changed
+BULK_CHANGE = 1000  # Above this many new or gone words the sorted list is rebuilt instead of edited
+RESCAN_CHARS = 10000  # Edits of more text than this count the whole tab again in the background
+CACHE_RANGE = 500  # Prefixes of more words than this keep their ranking, updated as counts change
+WORD_CHARS = "'’ʼ"  # Besides letters
+
+
+def is_word_char(char):
+    return char.isalpha() or char in WORD_CHARS
+
+
+def count_words(text):
+    return Counter(word for word in WORD_RE.findall(text) if len(word) >= MIN_WORD_LENGTH)
+
+
+class Vocabulary(RequestWorker):
+    """Frequency-weighted word index of the open tabs, for completion.
+
+    Words are kept in a sorted list, so the words with a prefix are one
+    bisect away and the best ranked of them are picked by their counts.
+    Short prefixes matching many words keep their ranking, which edits
+    update in place instead of ranking the whole range again. A
+    tab is counted once on the worker thread when it loads; after that
+    every edit only changes the counts of the words it touched, taken from
+    the text around it, so the document is never scanned again. Edits made
+    while a tab is being counted are queued and applied on top of the count.
+    """
+
+    def __init__(self, root):
+        self.words = []  # Every word with a positive count, sorted
+        self.counts = Counter()  # Word -> occurrences in all counted tabs
+        self.tab_counts = {}  # Tab id -> Counter of its words
+        self.queued = {}  # Tab id -> (word, delta) changes made while the tab is being counted
+        self.top = {}  # Prefix of more than CACHE_RANGE words -> its best ranked words
+        super().__init__(root, "natatnik-vocabulary")
+
+    def scan(self, tab_id, document):
+        """Count the words of a tab on the worker thread, replacing what was counted for it before."""
+        queued = self.queued[tab_id] = []
+        self.request(lambda counts: self._apply_scan(tab_id, queued, counts), self._count_snapshot,
+                     document.snapshot())
+
+    @staticmethod
+    def _count_snapshot(snapshot):
+        return count_words("".join(buffer[start:end] for buffer, start, end in snapshot))
+
+    def _apply_scan(self, tab_id, queued, counts):
+        if self.queued.get(tab_id) is not queued:
+            return  # The tab was closed, or counted again since
+        del self.queued[tab_id]
+        if counts is None:
+            return  # Counting failed, the tab keeps its old counts
+        changes = Counter(counts)
+        changes.subtract(self.tab_counts.get(tab_id, Counter()))
+        self._change(tab_id, [(word, delta) for word, delta in changes.items() if delta] + queued)
+
+    def forget(self, tab_id):
+        self.queued.pop(tab_id, None)
+        counts = self.tab_counts.get(tab_id)
+        if counts:
+            self._change(tab_id, [(word, -count) for word, count in counts.items()])
+        self.tab_counts.pop(tab_id, None)
+
+    def listener(self, tab_id, document):
+        """Return the edit listener that keeps the counts of a tab up to date."""
+        return lambda op, start, end, text: self.on_edit(tab_id, document, op, start, end, text)
+
+    def on_edit(self, tab_id, document, op, start, end, text):
+        if len(text) > RESCAN_CHARS:
+            self.scan(tab_id, document)  # Cheaper on the worker than word by word here
+            return
+        # Only the word at the edit changes: the letters just before and after it, with the edited text between
+        line, col = map(int, start.split("."))
+        offset = document.offset(line, col)
+        after = offset + len(text) if op == "insert" else offset
+        head = document.slice(max(0, offset - WORD_CONTEXT), offset)
+        tail = document.slice(after, after + WORD_CONTEXT)
+        cut = len(head)
+        while cut and is_word_char(head[cut - 1]):
+            cut -= 1
+        head = head[cut:]
+        cut = 0
+        while cut < len(tail) and is_word_char(tail[cut]):
+            cut += 1
+        tail = tail[:cut]
+        joined = head + tail
+        edited = head + text + tail
+        old, new = (joined, edited) if op == "insert" else (edited, joined)
+        changes = [(word, -1) for word in WORD_RE.findall(old) if len(word) >= MIN_WORD_LENGTH]
+        changes += [(word, 1) for word in WORD_RE.findall(new) if len(word) >= MIN_WORD_LENGTH]
+        if not changes:
+            return
+        if tab_id in self.queued:
+            self.queued[tab_id].extend(changes)
+        else:
+            self._change(tab_id, changes)
+
+    def _change(self, tab_id, changes):
+        tab_counts = self.tab_counts.setdefault(tab_id, Counter())
+        touched = set()  # Words that may have appeared or disappeared
+        for word, delta in changes:
+            tab_counts[word] += delta
+            if tab_counts[word] <= 0:
+                del tab_counts[word]
+            if word not in self.counts or self.counts[word] + delta <= 0:
+                touched.add(word)
+            self.counts[word] += delta
+            if self.counts[word] <= 0:
+                del self.counts[word]
+        if len(touched) > BULK_CHANGE:
+            self.words = sorted(self.counts)
+            self.top.clear()
+            return
+        for word, delta in changes:
+            self._update_top(word, delta)
+        for word in touched:
+            position = bisect_left(self.words, word)
+            listed = position < len(self.words) and self.words[position] == word
+            if word in self.counts and not listed:
+                self.words.insert(position, word)
+            elif listed and word not in self.counts:
+                del self.words[position]
+
+    def rank(self, word):
+        return -self.counts[word], len(word), word
+
+    def _update_top(self, word, delta):
+        for length in range(MIN_PREFIX_LENGTH, len(word) + 1):
+            top = self.top.get(word[:length])
+            if top is None:
+                continue
+            if delta < 0 and word in top:
+                del self.top[word[:length]]  # A word below it may now rank higher, rank the prefix again
+            elif delta > 0 and word in self.counts:
+                if word not in top:
+                    top.append(word)
+                top.sort(key=self.rank)
+                del top[MAX_SUGGESTIONS + 1:]
+
+    def best(self, prefix):
+        """Return the best ranked MAX_SUGGESTIONS + 1 words starting with prefix, which may include prefix."""
+        top = self.top.get(prefix)
+        if top is None:
+            words = self._starting_with(prefix)
+            top = heapq.nsmallest(MAX_SUGGESTIONS + 1, words, key=self.rank)
+            if len(words) > CACHE_RANGE:
+                self.top[prefix] = top
+        return top
+
+    def suggest(self, prefix, limit=MAX_SUGGESTIONS):
+        """Return up to limit words starting with prefix, most frequent first."""
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            return []
+        counts = {word: self.counts[word] for word in self.best(prefix)}
+        if prefix[0].isupper():
+            # At the start of a sentence lowercase words are offered capitalized
+            for word in self.best(prefix[0].lower() + prefix[1:]):
+                capitalized = word[0].upper() + word[1:]
+                counts[capitalized] = counts.get(capitalized, 0) + self.counts[word]
+        counts.pop(prefix, None)
+        return heapq.nsmallest(limit, counts, key=lambda word: (-counts[word], len(word), word))
+
+    def _starting_with(self, prefix):
+        first = bisect_left(self.words, prefix)
+        last = bisect_left(self.words, prefix[:-1] + chr(ord(prefix[-1]) + 1), first)
+        return self.words[first:last]
+
+
+class CompletionPopup:
+    """Suggestions for the word being typed, in a list placed below the cursor of a TextWidget."""
+
+    def __init__(self, text_widget, vocabulary):
+        self.text_widget = text_widget
+        self.vocabulary = vocabulary
+        self.listbox = None
+        self.prefix = None  # Word before the cursor while suggestions are shown
+
+    def update(self):
+        """Show the suggestions for the word before the cursor, or hide the list if there are none."""
+        widget = self.text_widget
+        line, col = map(int, widget.index(tk.INSERT).split("."))
+        offset = widget.document.offset(line, col)
+        head = widget.document.slice(max(0, offset - WORD_CONTEXT), offset)
+        following = widget.document.slice(offset, offset + 1)
+        cut = len(head)
+        while cut and is_word_char(head[cut - 1]):
+            cut -= 1
+        prefix = head[cut:]
+        suggestions = self.vocabulary.suggest(prefix) if not (following and is_word_char(following)) else []
+        bbox = widget.bbox(tk.INSERT) if suggestions else None
+        if not bbox:
+            self.hide()
+            return
+        if self.listbox is None:
+            self.listbox = tk.Listbox(widget, bg="#1a1a1a", fg="#e0e0e0", selectbackground="#4a4a4a",
+                                      selectforeground="#FFFFFF", activestyle="none", exportselection=False,
+                                      highlightthickness=1, bd=0, cursor="arrow")
+            self.listbox.bind("<ButtonRelease-1>", lambda event: self.accept())
+        self.listbox.configure(font=widget.cget("font"), height=len(suggestions),
+                               width=max(len(word) for word in suggestions) + 1)
+        self.listbox.delete(0, "end")
+        self.listbox.insert("end", *suggestions)
+        self.listbox.selection_set(0)
+        self.listbox.place(x=bbox[0], y=bbox[1] + bbox[3])
+        self.prefix = prefix
+
+    def hide(self):
+        if self.listbox is not None:
+            self.listbox.place_forget()
+        self.prefix = None
+
+    def handle_key(self, event):
+        """Handle a key meant for the list; return True if the key was used."""
+        if self.prefix is None:
+            return False
+        if event.keysym in ("Down", "Up"):
+            current = self.listbox.curselection()[0]
+            current = (current + (1 if event.keysym == "Down" else -1)) % self.listbox.size()
+            self.listbox.selection_clear(0, "end")
+            self.listbox.selection_set(current)
+            return True
+        if event.keysym in ("Return", "Tab"):
+            self.accept()
+            return True
+        if event.keysym == "Escape":
+            self.hide()
+            return True
+        return False
+
+    def accept(self):
+        selection = self.listbox.curselection()
+        if selection and self.prefix is not None:
+            self.text_widget.insert_text(self.listbox.get(selection[0])[len(self.prefix):])
+        self.hide()
@@ -0,0 +1,221 @@
+import hashlib
+import re
+from array import array
+from bisect import bisect_left
+
+ADD_BUFFER_LIMIT = 64 * 1024  # Inserted text is appended to one buffer until it reaches this size
+CHUNK_CHARS = 256 * 1024  # Largest slice yielded by iter_chunks
+NEWLINE_RE = re.compile("\n")
+
+
+def newline_positions(text, offset=0):
+    return array("q", (match.start() + offset for match in NEWLINE_RE.finditer(text)))
+
+
+class PieceTable:
+    """Python mirror of the text of a TextWidget, stored as a piece table.
+
+    The document is a list of pieces [buffer, start, length, newlines] over
+    immutable string buffers, so an edit only splits or trims the pieces
+    around it and a snapshot is a list of slices that later edits never
+    change. Every buffer has a sorted array of its newline positions, so a
+    "line.col" index is found with one pass over the pieces and a bisect.
+    """
+
+    def __init__(self, text=""):
+        self.buffers = []  # Immutable strings, extended only by replacing the add buffer with a longer one
+        self.newlines = []  # Newline positions of every buffer
+        self.pieces = []
+        self.add_buffer = None  # Buffer that small inserts are appended to
+        self.length = 0
+        self.line_count = 1
+        self.cached_digest = None
+        if text:
+            self.pieces.append(self._new_piece(text))
+            self.length = len(text)
+            self.line_count += self.pieces[0][3]
+
+    def on_edit(self, op, start, end, text):
+        """Edit listener of the TextWidget; indices are "line.col", end is before the edit."""
+        line, col = map(int, start.split("."))
+        if op == "insert":
+            self.insert(line, col, text)
+        else:
+            end_line, end_col = map(int, end.split("."))
+            self.delete(line, col, end_line, end_col)
+
+    def _new_piece(self, text):
+        self.buffers.append(text)
+        self.newlines.append(newline_positions(text))
+        return [len(self.buffers) - 1, 0, len(text), len(self.newlines[-1])]
+
+    def _count_newlines(self, buffer, start, end):
+        positions = self.newlines[buffer]
+        return bisect_left(positions, end) - bisect_left(positions, start)
+
+    def _locate(self, line, col):
+        """Return (piece number, offset in the piece, offset in the document) of a position."""
+        remaining = line - 1  # Newlines to pass before the line starts
+        offset = 0
+        number = 0
+        local = 0
+        pieces = self.pieces
+        while number < len(pieces):
+            buffer, start, length, newlines = pieces[number]
+            if remaining > newlines:
+                remaining -= newlines
+                offset += length
+                number += 1
+                continue
+            if remaining:
+                positions = self.newlines[buffer]
+                local = positions[bisect_left(positions, start) + remaining - 1] - start + 1
+                remaining = 0
+            break
+        # Move col characters forward from the start of the line, possibly across pieces
+        while number < len(pieces):
+            length = pieces[number][2]
+            if local + col <= length:
+                return number, local + col, offset + local + col
+            col -= length - local
+            offset += length
+            number += 1
+            local = 0
+        return len(pieces), 0, self.length
+
+    def insert(self, line, col, text):
+        if not text:
+            return
+        self.cached_digest = None
+        number, local, _ = self._locate(line, col)
+        newlines = text.count("\n")
+        self.length += len(text)
+        self.line_count += newlines
+        if len(text) >= ADD_BUFFER_LIMIT:
+            piece = self._new_piece(text)
+        else:
+            add = self.add_buffer
+            if add is None or len(self.buffers[add]) + len(text) > ADD_BUFFER_LIMIT:
+                self.buffers.append("")
+                self.newlines.append(array("q"))
+                add = self.add_buffer = len(self.buffers) - 1
+            add_start = len(self.buffers[add])
+            self.buffers[add] += text
+            self.newlines[add].extend(newline_positions(text, add_start))
+            # Typing at the end of the piece that ends the add buffer just grows that piece
+            previous = self.pieces[number - 1] if local == 0 and number > 0 else None
+            current = self.pieces[number] if number < len(self.pieces) else None
+            target = current if current is not None and local == current[2] else previous
+            if target is not None and target[0] == add and target[1] + target[2] == add_start:
+                target[2] += len(text)
+                target[3] += newlines
+                return
+            piece = [add, add_start, len(text), newlines]
+        if number == len(self.pieces):
+            self.pieces.append(piece)
+        elif local == 0:
+            self.pieces.insert(number, piece)
+        elif local == self.pieces[number][2]:
+            self.pieces.insert(number + 1, piece)
+        else:
+            buffer, start, length, _ = self.pieces[number]
+            left = [buffer, start, local, self._count_newlines(buffer, start, start + local)]
+            right = [buffer, start + local, length - local,
+                     self._count_newlines(buffer, start + local, start + length)]
+            self.pieces[number:number + 1] = [left, piece, right]
+
+    def delete(self, line, col, end_line, end_col):
+        first, first_local, first_offset = self._locate(line, col)
+        last, last_local, last_offset = self._locate(end_line, end_col)
+        if last_offset <= first_offset:
+            return
+        self.cached_digest = None
+        replacement = []
+        if first_local:
+            buffer, start, _, _ = self.pieces[first]
+            replacement.append([buffer, start, first_local, self._count_newlines(buffer, start, start + first_local)])
+        if last < len(self.pieces) and last_local < self.pieces[last][2]:
+            buffer, start, length, _ = self.pieces[last]
+            replacement.append([buffer, start + last_local, length - last_local,
+                                self._count_newlines(buffer, start + last_local, start + length)])
+        removed_newlines = sum(piece[3] for piece in self.pieces[first:last + 1])
+        self.pieces[first:last + 1] = replacement
+        self.line_count += sum(piece[3] for piece in replacement) - removed_newlines
+        self.length -= last_offset - first_offset
+        if last_offset - first_offset >= ADD_BUFFER_LIMIT:
+            self._release_buffers()
+
+    def _release_buffers(self):
+        # After a large delete, e.g. the whole document being replaced, free the buffers no piece uses.
+        # Their numbers stay taken, so the pieces keep pointing at the right buffers; snapshots hold
+        # their own references to the strings.
+        used = {piece[0] for piece in self.pieces}
+        for buffer, text in enumerate(self.buffers):
+            if text and buffer not in used:
+                self.buffers[buffer] = ""
+                self.newlines[buffer] = array("q")
+                if buffer == self.add_buffer:
+                    self.add_buffer = None
+
+    def snapshot(self):
+        """Return the document as a list of (buffer, start, end) slices that later edits do not change."""
+        return [(self.buffers[buffer], start, start + length) for buffer, start, length, _ in self.pieces]
+
+    def iter_chunks(self, snapshot=None):
+        """Yield the text in order, in pieces of at most CHUNK_CHARS characters."""
+        for buffer, start, end in snapshot if snapshot is not None else self.snapshot():
+            for chunk_start in range(start, end, CHUNK_CHARS):
+                yield buffer[chunk_start:min(chunk_start + CHUNK_CHARS, end)]
+
+    def text(self):
+        return "".join(self.iter_chunks())
+
+    def offset(self, line, col):
+        """Return the character offset of a position."""
+        return self._locate(line, col)[2]
+
+    def slice(self, start, end):
+        """Return the text between two character offsets."""
+        parts = []
+        offset = 0
+        for buffer, piece_start, length, _ in self.pieces:
+            if offset >= end:
+                break
+            if offset + length > start:
+                low = max(start - offset, 0)
+                high = min(end - offset, length)
+                parts.append(self.buffers[buffer][piece_start + low:piece_start + high])
+            offset += length
+        return "".join(parts)
+
+    def get_lines(self, first, last):
+        """Return lines first..last (1-based, inclusive) joined by newlines, like Text.get("first.0", "last.end")."""
+        last = min(last, self.line_count)
+        start = self.offset(first, 0)
+        if last == self.line_count:
+            end = self.length
+        else:
+            end = self.offset(last + 1, 0) - 1
+        return self.slice(start, end)
+
+    def get_line(self, line):
+        return self.get_lines(line, line)
+
+    def iter_lines(self):
+        """Yield every line of the document without building the whole text."""
+        partial = ""
+        for chunk in self.iter_chunks():
+            lines = chunk.split("\n")
+            lines[0] = partial + lines[0]
+            partial = lines.pop()
+            yield from lines
+        yield partial
+
+    def digest(self):
+        """Return the content hash of the document, the same as autosave.content_hash of its text."""
+        if self.cached_digest is None:
+            hasher = hashlib.blake2b(digest_size=16)
+            for chunk in self.iter_chunks():
+                hasher.update(chunk.encode("utf-8"))
+            self.cached_digest = hasher.digest()
+        return self.cached_digest
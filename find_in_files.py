@@ -0,0 +1,122 @@
+import os
+import queue
+
+from search import compile_query
+
+MAX_MATCHES_PER_FILE = 500  # Further matches in a file are not listed
+EXCERPT_CHARS = 60  # Characters shown on each side of a match
+RESULT_POLL_MS = 50
+
+
+def excerpt(line, start, end):
+    left = max(0, start - EXCERPT_CHARS)
+    right = min(len(line), end + EXCERPT_CHARS)
+    return ("…" if left else "") + line[left:right].strip() + ("…" if right < len(line) else "")
+
+
+def search_file(path, text, query, regex, match_case):
+    """Worker process job: return the matches of the query in a file, or in text if it is given.
+
+    Matches are found line by line and returned as (line, start column, end
+    column, excerpt) tuples.
+    """
+    pattern = compile_query(query, regex, match_case)
+    matches = []
+    if text is not None:
+        lines = text.split("\n")
+    else:
+        lines = open(path, "r", encoding="utf-8", errors="replace")
+    try:
+        for number, line in enumerate(lines, start=1):
+            line = line.rstrip("\n")
+            for match in pattern.finditer(line):
+                if match.end() == match.start():
+                    continue
+                matches.append((number, match.start(), match.end(), excerpt(line, match.start(), match.end())))
+                if len(matches) >= MAX_MATCHES_PER_FILE:
+                    return matches
+    finally:
+        if text is None:
+            lines.close()
+    return matches
+
+
+class FileSearch:
+    """Searches many files at once in a process pool.
+
+    Every file is a separate job, so results come back file by file as they
+    are found; on_result is called on the Tk thread with the path and its
+    matches, on_done once every file of the search is finished. Starting a
+    new search cancels the files of the previous one that did not start yet.
+    The pool is created on the first search and kept for the next ones.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.pool = None
+        self.results = queue.Queue()
+        self.generation = 0
+        self.futures = []
+        self.pending = 0  # Files of the current search without a result yet
+        self.polling = False
+        self.on_result = None
+        self.on_done = None
+
+    def start(self, sources, query, regex, match_case, on_result, on_done):
+        """Search (path, text or None) sources; text is given for tabs whose file on disk is out of date."""
+        self.cancel()
+        if self.pool is None:
+            from concurrent.futures import ProcessPoolExecutor  # Imports multiprocessing, not needed to start
+            self.pool = ProcessPoolExecutor(max_workers=max(1, min(4, (os.cpu_count() or 2) - 1)))
+        generation = self.generation
+        self.on_result = on_result
+        self.on_done = on_done
+        self.pending = len(sources)
+        for path, text in sources:
+            future = self.pool.submit(search_file, path, text, query, regex, match_case)
+            future.path = path
+            # Called on a pool thread, the Tk thread picks the result up from the queue
+            future.add_done_callback(lambda f: self.results.put((generation, f)))
+            self.futures.append(future)
+        if not sources:
+            on_done()
+        elif not self.polling:
+            self.polling = True
+            self.root.after(RESULT_POLL_MS, self._poll_results)
+
+    def cancel(self):
+        self.generation += 1
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
+        self.pending = 0
+
+    def _poll_results(self):
+        while True:
+            try:
+                generation, future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.generation or future.cancelled():
+                continue
+            self.pending -= 1
+            try:
+                matches = future.result()
+            except Exception as e:
+                print(f"Error searching {future.path}: {e}")
+                matches = []
+            if matches:
+                self.on_result(future.path, matches)
+            if self.pending == 0:
+                self.futures = []
+                self.on_done()
+        if self.pending > 0:
+            self.root.after(RESULT_POLL_MS, self._poll_results)
+        else:
+            self.polling = False
+
+    def shutdown(self):
+        self.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
@@ -0,0 +1,224 @@
+import struct
+import time
+import zlib
+
+from autosave import RequestWorker, content_hash
+
+HISTORY_INTERVAL = 300  # Seconds between versions recorded for a tab
+KEYFRAME_EVERY = 50  # A full copy is stored after this many deltas to bound restore time
+CACHE_SIZE = 8  # Files whose latest version is kept in memory to compute the next delta
+DELTA_HEADER = struct.Struct("<QQ")  # Length of the common prefix and suffix
+HOUR = 3600
+DAY = 24 * HOUR
+# (age, spacing): versions younger than age are thinned to one per spacing seconds, older ones by the next tier
+RETENTION = [(DAY, 0), (7 * DAY, HOUR), (30 * DAY, DAY), (None, 7 * DAY)]
+MAX_VERSIONS = 500  # Per file, the oldest versions beyond it are dropped
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    created REAL NOT NULL,
+    size INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    keyframe INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS versions_by_file ON versions(file_id, id);
+"""
+
+
+def common_prefix_length(a, b):
+    # Binary search over slice comparisons keeps the work in C even for huge texts
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def common_suffix_length(a, b, limit):
+    low, high = 0, min(len(a), len(b), limit)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def encode_delta(old, new):
+    """Encode new as the part that differs from old between their common prefix and suffix."""
+    prefix = common_prefix_length(old, new)
+    suffix = common_suffix_length(old, new, min(len(old), len(new)) - prefix)
+    middle = new[prefix:len(new) - suffix]
+    return zlib.compress(DELTA_HEADER.pack(prefix, suffix) + middle.encode("utf-8"))
+
+
+def apply_delta(old, data):
+    data = zlib.decompress(data)
+    prefix, suffix = DELTA_HEADER.unpack_from(data)
+    middle = data[DELTA_HEADER.size:].decode("utf-8")
+    return old[:prefix] + middle + old[len(old) - suffix:]
+
+
+def versions_to_keep(versions, now):
+    """Return the ids of the versions the retention policy keeps.
+
+    versions are (id, creation time) pairs, oldest first. Every version is
+    kept while it is recent; older ones are thinned to the newest version of
+    each hour, then of each day and of each week, and at most MAX_VERSIONS of
+    them are kept. The newest version is always kept.
+    """
+    keep = []
+    buckets = set()
+    for version_id, created in reversed(versions):
+        age = now - created
+        for max_age, spacing in RETENTION:
+            if max_age is None or age < max_age:
+                break
+        if spacing:
+            bucket = (spacing, int(created // spacing))
+            if bucket in buckets:
+                continue  # A newer version of the same hour, day or week is kept
+            buckets.add(bucket)
+        keep.append(version_id)
+        if len(keep) == MAX_VERSIONS:
+            break
+    return set(keep)
+
+
+class HistoryStore(RequestWorker):
+    """Local version history of files in SQLite, kept on its own worker thread.
+
+    Versions are stored as zlib-compressed deltas against the previous
+    version, with a full keyframe every KEYFRAME_EVERY versions. Whenever a
+    keyframe is written, older versions of the file are thinned out as
+    versions_to_keep says and deltas left without their base are re-encoded
+    against the surviving versions. Queries are submitted with a callback
+    that is called on the Tk thread with the result.
+    """
+
+    def __init__(self, db_path, root):
+        self.db_path = db_path
+        self.connection = None  # Created on the worker thread, which is the only one using it
+        self.latest = {}  # path -> (version id, content), most recently used last
+        super().__init__(root, "natatnik-history")
+
+    def _db(self):
+        if self.connection is None:
+            import sqlite3  # Imported by the worker, off the startup path
+            self.connection = sqlite3.connect(self.db_path)
+            self.connection.executescript(SCHEMA)
+        return self.connection
+
+    def _file_id(self, path, create=False):
+        db = self._db()
+        row = db.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+        if row:
+            return row[0]
+        if not create:
+            return None
+        return db.execute("INSERT INTO files (path) VALUES (?)", (path,)).lastrowid
+
+    def add_version(self, path, content):
+        """Worker job: record content as the newest version of path unless it did not change."""
+        db = self._db()
+        file_id = self._file_id(path, create=True)
+        digest = content_hash(content)
+        last = db.execute("SELECT id, digest FROM versions WHERE file_id = ? ORDER BY id DESC LIMIT 1",
+                          (file_id,)).fetchone()
+        if last and last[1] == digest:
+            return
+        since_keyframe = db.execute(
+            "SELECT COUNT(*) FROM versions WHERE file_id = ? AND id > "
+            "COALESCE((SELECT MAX(id) FROM versions WHERE file_id = ? AND keyframe = 1), 0)",
+            (file_id, file_id)).fetchone()[0]
+        keyframe = not last or since_keyframe >= KEYFRAME_EVERY
+        if keyframe:
+            data = zlib.compress(content.encode("utf-8"))
+        else:
+            data = encode_delta(self._content_of(path, last[0]), content)
+        with db:
+            version_id = db.execute(
+                "INSERT INTO versions (file_id, created, size, digest, keyframe, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (file_id, time.time(), len(content), digest, int(keyframe), data)).lastrowid
+        self._remember(path, version_id, content)
+        if keyframe and last:
+            self._prune(file_id)
+
+    def _prune(self, file_id):
+        db = self._db()
+        rows = db.execute("SELECT id, created FROM versions WHERE file_id = ? ORDER BY id", (file_id,)).fetchall()
+        keep = versions_to_keep(rows, time.time())
+        if len(keep) == len(rows):
+            return
+        updates = []
+        content = previous = None  # Content of the current and of the last kept version
+        previous_id = None  # Last version read, kept or not
+        chain = 0  # Deltas since the last kept keyframe
+        for version_id, keyframe, data in db.execute("SELECT id, keyframe, data FROM versions WHERE file_id = ? "
+                                                     "ORDER BY id", (file_id,)):
+            content = zlib.decompress(data).decode("utf-8") if keyframe else apply_delta(content, data)
+            based_on_kept = previous_id in keep  # Only then its delta is still valid
+            previous_id = version_id
+            if version_id not in keep:
+                continue
+            if keyframe:
+                chain = 0
+            elif previous is None or chain >= KEYFRAME_EVERY:
+                updates.append((1, zlib.compress(content.encode("utf-8")), version_id))
+                chain = 0
+            else:
+                if not based_on_kept:
+                    updates.append((0, encode_delta(previous, content), version_id))
+                chain += 1
+            previous = content
+        with db:
+            db.executemany("UPDATE versions SET keyframe = ?, data = ? WHERE id = ?", updates)
+            db.executemany("DELETE FROM versions WHERE id = ?", [(row[0],) for row in rows if row[0] not in keep])
+
+    def add_version_from_file(self, path):
+        """Worker job: record the content of the file at path."""
+        with open(path, "r", encoding="utf-8") as f:
+            self.add_version(path, f.read())
+
+    def list_versions(self, path):
+        """Worker job: return (version id, creation time, size) of the versions of path, newest first."""
+        file_id = self._file_id(path)
+        if file_id is None:
+            return []
+        return self._db().execute("SELECT id, created, size FROM versions WHERE file_id = ? ORDER BY id DESC",
+                                  (file_id,)).fetchall()
+
+    def get_version(self, path, version_id):
+        """Worker job: return the content of a version."""
+        return self._content_of(path, version_id)
+
+    def _content_of(self, path, version_id):
+        cached = self.latest.get(path)
+        if cached and cached[0] == version_id:
+            return cached[1]
+        db = self._db()
+        file_id, = db.execute("SELECT file_id FROM versions WHERE id = ?", (version_id,)).fetchone()
+        keyframe_id, = db.execute("SELECT MAX(id) FROM versions WHERE file_id = ? AND id <= ? AND keyframe = 1",
+                                  (file_id, version_id)).fetchone()
+        content = None
+        for keyframe, data in db.execute("SELECT keyframe, data FROM versions WHERE file_id = ? AND id >= ? AND id <= ? "
+                                         "ORDER BY id", (file_id, keyframe_id, version_id)):
+            content = zlib.decompress(data).decode("utf-8") if keyframe else apply_delta(content, data)
+        return content
+
+    def _remember(self, path, version_id, content):
+        self.latest.pop(path, None)
+        self.latest[path] = (version_id, content)
+        while len(self.latest) > CACHE_SIZE:
+            del self.latest[next(iter(self.latest))]
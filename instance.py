@@ -0,0 +1,96 @@
+import json
+import os
+import queue
+import secrets
+import socket
+import threading
+
+from autosave import atomic_write
+
+INSTANCE_FILE = "instance.json"  # Port and token of the running editor, in the settings directory
+CONNECT_TIMEOUT = 0.5  # Seconds; a running editor answers at once, a stale port file is refused at once
+POLL_MS = 50
+MAX_REQUEST = 1024 * 1024
+
+
+def forward_to_running_instance(settings_dir, paths):
+    """Hand paths to the editor already running for settings_dir; return False if there is none."""
+    try:
+        with open(os.path.join(settings_dir, INSTANCE_FILE), "r", encoding="utf-8") as f:
+            instance = json.load(f)
+        with socket.create_connection(("127.0.0.1", instance["port"]), timeout=CONNECT_TIMEOUT) as connection:
+            request = json.dumps({"token": instance["token"], "paths": paths}) + "\n"
+            connection.sendall(request.encode("utf-8"))
+            return connection.makefile("r", encoding="utf-8").readline().strip() == "ok"
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+
+class InstanceServer:
+    """Local socket through which later launches pass their files to this editor.
+
+    The server listens on a loopback port written with a random token to
+    INSTANCE_FILE, so only processes of the user who can read the settings
+    directory can use it. Paths received on the accept thread are queued and
+    handed to on_open on the Tk thread once attach() was called.
+    """
+
+    def __init__(self, settings_dir):
+        self.path = os.path.join(settings_dir, INSTANCE_FILE)
+        self.token = secrets.token_hex(16)
+        self.requests = queue.Queue()
+        self.root = None
+        self.on_open = None
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.socket.listen()
+        self.port = self.socket.getsockname()[1]
+        atomic_write(self.path, json.dumps({"port": self.port, "token": self.token, "pid": os.getpid()}))
+        self.thread = threading.Thread(target=self._serve, name="natatnik-instance", daemon=True)
+        self.thread.start()
+
+    def attach(self, root, on_open):
+        """Start handing received paths to on_open(paths) on the Tk thread."""
+        self.root = root
+        self.on_open = on_open
+        self._poll()
+
+    def _serve(self):
+        while True:
+            try:
+                connection, _ = self.socket.accept()
+            except OSError:
+                return  # Closed
+            try:
+                with connection:
+                    connection.settimeout(CONNECT_TIMEOUT)
+                    line = connection.makefile("r", encoding="utf-8").readline(MAX_REQUEST)
+                    request = json.loads(line)
+                    if request.get("token") != self.token:
+                        continue
+                    self.requests.put([str(path) for path in request.get("paths", [])])
+                    connection.sendall(b"ok\n")
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"Error receiving files from another instance: {e}")
+
+    def _poll(self):
+        while True:
+            try:
+                paths = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                self.on_open(paths)
+            except Exception as e:
+                print(f"Error opening files from another instance: {e}")
+        self.root.after(POLL_MS, self._poll)
+
+    def close(self):
+        self.socket.close()
+        # Leave the file alone if a newer instance took over
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                if json.load(f).get("token") == self.token:
+                    os.remove(self.path)
+        except (OSError, ValueError):
+            pass
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import struct
+
+from text_widget import split_index
+
+JOURNAL_MAGIC = b"NJNL1\n"
+HEADER_SIZE = len(JOURNAL_MAGIC) + 16  # Magic followed by the hash of the snapshot the edits apply to
+# op, line, col, then the UTF-8 length of the inserted text or the end line and col of a deletion
+RECORD = struct.Struct("<BIIII")
+OP_INSERT = 0
+OP_DELETE = 1
+FLUSH_INTERVAL = 300  # ms
+
+
+def journal_path(directory, filename):
+    """Return the journal file of the tab editing filename."""
+    key = hashlib.blake2b(os.path.abspath(filename).encode("utf-8"), digest_size=8).hexdigest()
+    return os.path.join(directory, f"{key}.jnl")
+
+
+def reset_journal(path, digest, records=b""):
+    """Writer job: start a journal of records on top of the snapshot whose content hash is digest."""
+    with open(path, "wb") as f:
+        f.write(JOURNAL_MAGIC + digest + records)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def append_records(path, data):
+    """Writer job: append a batch of encoded records."""
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def remove_journal(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def read_records(data):
+    """Decode the records of a journal, stopping at a record cut short by a crash."""
+    records = []
+    offset = HEADER_SIZE
+    while offset + RECORD.size <= len(data):
+        op, line, col, arg1, arg2 = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if op == OP_INSERT:
+            if offset + arg1 > len(data):
+                break
+            records.append((op, f"{line}.{col}", data[offset:offset + arg1].decode("utf-8")))
+            offset += arg1
+        else:
+            records.append((op, f"{line}.{col}", f"{arg1}.{arg2}"))
+    return records
+
+
+class Journal:
+    """Append-only binary log of the edits made to one tab since its last snapshot.
+
+    Edits are encoded as they reach the widget's edit listeners, batched and
+    handed to the background writer every FLUSH_INTERVAL ms. Every snapshot
+    written by autosave or save restarts the journal, so replaying it onto the
+    file on disk restores the edits made after that snapshot. Edits made while
+    a snapshot is being saved go to the current journal and are also kept for
+    the restarted one, which starts with them.
+    """
+
+    def __init__(self, path, text_widget, writer, scheduler):
+        self.path = path
+        self.text_widget = text_widget
+        self.writer = writer
+        self.scheduler = scheduler
+        self.pending = bytearray()
+        self.recording = True
+        self.since_snapshot = None  # Records made since begin_snapshot(), while the snapshot is saved
+        text_widget.edit_listeners.append(self.on_edit)
+
+    def on_edit(self, op, start, end, text):
+        if not self.recording:
+            return
+        line, col = split_index(start)
+        if op == "insert":
+            payload = text.encode("utf-8")
+            record = RECORD.pack(OP_INSERT, line, col, len(payload), 0) + payload
+        else:
+            end_line, end_col = split_index(end)
+            record = RECORD.pack(OP_DELETE, line, col, end_line, end_col)
+        self.pending += record
+        if self.since_snapshot is not None:
+            self.since_snapshot += record
+        self.scheduler.schedule(("journal", self.path), self.flush, delay=FLUSH_INTERVAL, max_delay=FLUSH_INTERVAL)
+
+    def flush(self):
+        self.scheduler.cancel(("journal", self.path))
+        if self.pending:
+            self.writer.submit(append_records, self.path, bytes(self.pending))
+            self.pending.clear()
+
+    def begin_snapshot(self):
+        """Keep the edits made from now on for the journal restarted when the snapshot taken now is saved."""
+        self.since_snapshot = bytearray()
+
+    def abort_snapshot(self):
+        self.since_snapshot = None
+
+    def restart(self, digest):
+        """Compact the journal after a snapshot with content hash digest was saved.
+
+        The new journal holds the edits made since begin_snapshot(), which
+        are not in the snapshot. The reset is queued behind the snapshot's
+        own writer job, so the old journal is kept until the snapshot is on
+        disk.
+        """
+        self.flush()
+        records = bytes(self.since_snapshot or b"")
+        self.since_snapshot = None
+        self.writer.submit(reset_journal, self.path, digest, records)
+
+    def retarget(self, path):
+        """Move the journal to a new path, e.g. after the tab was saved under another name."""
+        self.flush()
+        self.writer.submit(remove_journal, self.path)
+        self.path = path
+
+    def discard(self):
+        """Stop journaling and delete the journal, e.g. when the tab is closed."""
+        self.pending.clear()
+        self.scheduler.cancel(("journal", self.path))
+        if self.on_edit in self.text_widget.edit_listeners:
+            self.text_widget.edit_listeners.remove(self.on_edit)
+        self.writer.submit(remove_journal, self.path)
+
+    def replay(self, digest):
+        """Apply the edits journaled by a previous session; digest is the content hash of the loaded snapshot.
+
+        Returns True if edits were recovered. A journal written on top of
+        another snapshot (the file changed since) is ignored.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return False
+        if len(data) <= HEADER_SIZE or data[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+            return False
+        if data[len(JOURNAL_MAGIC):HEADER_SIZE] != digest:
+            return False
+        records = read_records(data)
+        self.recording = False
+        try:
+            for op, pos, arg in records:
+                if op == OP_INSERT:
+                    self.text_widget.insert(pos, arg)
+                else:
+                    self.text_widget.delete(pos, arg)
+        finally:
+            self.recording = True
+        return bool(records)
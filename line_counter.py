@@ -0,0 +1,139 @@
+import re
+from tkinter import font as tkfont
+
+from text_widget import split_index
+
+# A word together with the spaces that follow it, or a run of leading spaces. Like Tk,
+# only spaces and tabs are break opportunities, so non-breaking spaces stay in the word.
+WORD_RE = re.compile(r"[^ \t]+[ \t]*|[ \t]+")
+WORD_CACHE_LIMIT = 100000
+
+
+class LineCounter:
+    """Per-tab cache of the number of visual (wrapped) lines of every logical line."""
+
+    def __init__(self, text_widget):
+        self.text_widget = text_widget
+        self.line_counts = []  # Visual lines per logical line, None while stale
+        self.stale_lines = set()  # 1-based numbers of the logical lines to re-measure
+        self.total = 0
+        self.needs_full_count = True
+        self.font_key = None
+        self.wrap_width = None
+        self.text_font = None
+        self.glyph_widths = {}  # Width table: character -> pixels
+        self.word_widths = {}  # Token -> (width without trailing spaces, full width)
+        text_widget.edit_listeners.append(self.on_edit)
+
+    def on_edit(self, op, start, end, text):
+        """Drop the cached counts of the logical lines touched by an edit."""
+        if self.needs_full_count:
+            return
+        first = split_index(start)[0]
+        if op == "insert":
+            removed, added = 0, text.count("\n")
+        else:
+            removed, added = split_index(end)[0] - first, 0
+        old_counts = self.line_counts[first - 1:first + removed]
+        self.total -= sum(count for count in old_counts if count)
+        self.line_counts[first - 1:first + removed] = [None] * (added + 1)
+
+        shift = added - removed
+        self.stale_lines = {line + shift if line > first + removed else line
+                            for line in self.stale_lines if not first < line <= first + removed}
+        self.stale_lines.update(range(first, first + added + 1))
+
+    def count(self):
+        """Return the number of visual lines, re-measuring only what changed."""
+        font_key = str(self.text_widget.cget("font"))
+        if font_key != self.font_key:
+            self.font_key = font_key
+            self.text_font = tkfont.Font(root=self.text_widget, font=font_key)
+            self.glyph_widths.clear()
+            self.word_widths.clear()
+            self.needs_full_count = True
+
+        wrap_width = self.get_wrap_width()
+        if wrap_width != self.wrap_width:
+            self.wrap_width = wrap_width
+            self.word_widths.clear()
+            self.needs_full_count = True
+
+        if self.needs_full_count:
+            self.count_all()
+        elif self.stale_lines:
+            self.count_stale()
+        return self.total
+
+    def get_wrap_width(self):
+        widget = self.text_widget
+        width = widget.winfo_width()
+        if width <= 1:
+            # Not mapped yet, let Tk compute the geometry first
+            widget.update_idletasks()
+            width = widget.winfo_width()
+        insets = int(widget.cget("borderwidth")) + int(widget.cget("highlightthickness")) + int(widget.cget("padx"))
+        return max(width - 2 * insets, 1)
+
+    def count_all(self):
+        self.line_counts = [self.measure_line(line) for line in self.text_widget.document.iter_lines()]
+        self.total = sum(self.line_counts)
+        self.stale_lines.clear()
+        self.needs_full_count = False
+
+    def count_stale(self):
+        # Re-measure contiguous runs of stale lines with one slice of the document per run
+        lines = sorted(self.stale_lines)
+        self.stale_lines.clear()
+        run_start = prev = lines[0]
+        for line in lines[1:] + [None]:
+            if line is not None and line == prev + 1:
+                prev = line
+                continue
+            texts = self.text_widget.document.get_lines(run_start, prev).split("\n")
+            for number, text in enumerate(texts, start=run_start):
+                count = self.measure_line(text)
+                self.line_counts[number - 1] = count
+                self.total += count
+            run_start = prev = line
+
+    def measure_line(self, line):
+        """Emulate Tk's word wrapping to count the visual lines of one logical line."""
+        if not line:
+            return 1
+        width = self.wrap_width
+        rows = 1
+        x = 0
+        for token in WORD_RE.findall(line):
+            ink, full = self.measure_word(token)
+            if x + ink <= width:
+                x += full  # Trailing spaces may hang past the edge, as in Tk
+            elif ink <= width:
+                rows += 1
+                x = full
+            else:
+                # A word wider than the line is broken between characters
+                for char in token:
+                    char_width = self.measure_glyph(char)
+                    if x and x + char_width > width:
+                        rows += 1
+                        x = 0
+                    x += char_width
+        return rows
+
+    def measure_word(self, token):
+        widths = self.word_widths.get(token)
+        if widths is None:
+            if len(self.word_widths) > WORD_CACHE_LIMIT:
+                self.word_widths.clear()
+            word = token.rstrip(" \t")
+            ink = sum(self.measure_glyph(char) for char in word)
+            full = ink + sum(self.measure_glyph(char) for char in token[len(word):])
+            widths = self.word_widths[token] = (ink, full)
+        return widths
+
+    def measure_glyph(self, char):
+        width = self.glyph_widths.get(char)
+        if width is None:
+            width = self.glyph_widths[char] = self.text_font.measure(char)
+        return width
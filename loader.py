@@ -0,0 +1,86 @@
+import os
+import queue
+import threading
+import time
+
+CHUNK_CHARS = 64 * 1024  # Characters decoded and inserted at a time
+QUEUE_CHUNKS = 32  # Chunks decoded ahead of the Tk thread, bounding the memory of a load
+SYNC_LOAD_LIMIT = 1024 * 1024  # Files up to this many bytes are read in one go on the Tk thread
+SLICE_MS = 15  # Time spent inserting chunks before the Tk event loop gets control back
+POLL_MS = 20  # Wait before looking for new chunks when the reader is behind
+
+
+class FileLoader:
+    """Loads a file into a TextWidget progressively.
+
+    A worker thread reads and decodes the file in chunks of CHUNK_CHARS
+    characters; the Tk thread appends them in slices of SLICE_MS, so the
+    window stays responsive and the loaded part can be scrolled. on_progress
+    is called with the bytes read and the file size, on_done with None or
+    the error that stopped the load.
+    """
+
+    def __init__(self, path, text_widget, on_progress, on_done, encoding="utf-8"):
+        self.path = path
+        self.text_widget = text_widget
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.encoding = encoding
+        self.size = os.path.getsize(path)
+        self.bytes_read = 0
+        self.chunks = queue.Queue(QUEUE_CHUNKS)
+        self.cancelled = threading.Event()
+        self.error = None
+        self.job = None
+        self.thread = threading.Thread(target=self._read, name="natatnik-loader", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        self.job = self.text_widget.after(POLL_MS, self._step)
+
+    def cancel(self):
+        self.cancelled.set()
+        if self.job is not None:
+            self.text_widget.after_cancel(self.job)
+            self.job = None
+
+    def _read(self):
+        try:
+            # Text mode decodes incrementally and translates newlines like a plain read()
+            with open(self.path, "r", encoding=self.encoding) as f:
+                while not self.cancelled.is_set():
+                    text = f.read(CHUNK_CHARS)
+                    if not text:
+                        break
+                    self.bytes_read = f.buffer.tell()
+                    self._put(text)
+        except Exception as e:
+            self.error = e
+        self._put(None)
+
+    def _put(self, item):
+        # A full queue makes the reader wait for the Tk thread, unless the load is cancelled
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _step(self):
+        deadline = time.perf_counter() + SLICE_MS / 1000
+        delay = 1
+        while time.perf_counter() < deadline:
+            try:
+                text = self.chunks.get_nowait()
+            except queue.Empty:
+                delay = POLL_MS
+                break
+            if text is None:
+                self.job = None
+                self.on_progress(self.size, self.size)
+                self.on_done(self.error)
+                return
+            self.text_widget.append_loaded(text)
+        self.on_progress(self.bytes_read, self.size)
+        self.job = self.text_widget.after(delay, self._step)
@@ -1,9 +1,27 @@
-import json
 import os
-import textwrap
+import re
+import sys
+import time
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, font as tkfont, PhotoImage
-
+from tkinter import ttk
+
+from autosave import AUTOSAVE_INTERVAL, BackgroundWriter, StreamingSave, next_interval
+from completion import Vocabulary
+from find_in_files import FileSearch
+from history import HISTORY_INTERVAL, HistoryStore
+from instance import InstanceServer, forward_to_running_instance
+from journal import Journal, journal_path
+from line_counter import LineCounter
+from loader import FileLoader, SYNC_LOAD_LIMIT
+from mmap_viewer import MmapViewer
+from perf import PerfLog, PerfOverlay, timed
+from scheduler import IdleScheduler
+from search import FindBar, compile_query
+from settings import SettingsStore
+from spellcheck import SpellChecker
+from startup import PROFILE_FLAG, REPORT_FILE, StartupProfile
+from tabs import TabRegistry
+from text_stats import DocumentStatistics, StatisticsWorker
 from text_widget import TextWidget
 
 LABEL_FONT = ("Arial", 20)
@@ -19,9 +37,15 @@ SLIDER_TROUGH_COLOR = "#2a2a2a"
 SLIDER_HANDLE_COLOR = "#e0e0e0"
 SLIDER_ACTIVE_COLOR = "#25254C"
 
+# NATATNIK_HOME points the editor at another settings directory, e.g. a scratch one for benchmarks
+SETTINGS_DIR = os.environ.get("NATATNIK_HOME") or os.path.join(os.path.expanduser("~"), ".natatnik")
+
+ICON_SIZE = 32  # Toolbar icons are loaded after the first frame into blank images of this size
+
 
 class TextEditor:
-    def __init__(self, root: tk.Tk):
+    def __init__(self, root: tk.Tk, profile=None):
+        self.profile = profile or StartupProfile(False)
         self.open_tabs = None
         self.cursor_positions = None  # Store cursor positions for tabs
         self.font_size_display = None
@@ -29,37 +53,78 @@ class TextEditor:
         self.untitled_counter = 0
         self.fixed_tab_index = 1
         self.show_special = False
+        self.spellcheck = True
         self.selected_tab_index = None
         self.root = root
         self.root.title("Natatnik")
         self.root.geometry("1000x700")
-        self.root.iconbitmap("img/icon.ico")
 
         self.default_font_size = 28
-        self.settings_dir = os.path.join(os.path.expanduser("~"), ".natatnik")
+        self.undo_budget_mb = 16  # Per-tab memory budget of the undo history
+        self.max_live_tabs = 8  # Tabs whose text widgets are kept in memory, the rest are hibernated
+        self.hibernate_after_minutes = 30  # Unused tabs are hibernated after this long
+        self.viewer_threshold_mb = 256  # Larger files open in the read-only memory-mapped viewer
+        self.settings_dir = SETTINGS_DIR
         self.settings_file = os.path.join(self.settings_dir, "settings.json")
         self.autosave_dir = os.path.join(self.settings_dir, "autosave")
+        self.dictionary_path = os.path.join(self.settings_dir, "words_be.txt")  # One word per line
 
         # Create settings directory if it doesn't exist
         os.makedirs(self.settings_dir, exist_ok=True)
         os.makedirs(self.autosave_dir, exist_ok=True)
 
+        with self.profile.phase("settings"):
+            self.init_settings()
+        with self.profile.phase("workers"):
+            self.init_workers()
+        with self.profile.phase("main window"):
+            self.init_window()
+        with self.profile.phase("tabs"):
+            self.init_tabs()
+
+        # Menus, icons and the rest of what the first frame does not need wait until it is painted
+        self.root.bind("<Expose>", self.on_first_frame)
+
+    def init_settings(self):
+        # Follow-up work of edits (redraws, line counts, settings writes) runs coalesced when idle
+        self.scheduler = IdleScheduler(self.root)
+        # Disk writes of autosave and settings run on a worker thread
+        self.writer = BackgroundWriter()
+        self.settings = SettingsStore(self.settings_file, self.scheduler, self.writer, self.collect_settings)
+        # Latencies of the hot paths, appended to perf.jsonl every minute
+        self.perf_log = PerfLog(self.root, os.path.join(self.settings_dir, "perf.jsonl"), self.writer)
+
         self.load_settings()
 
+    def init_workers(self):
+        self.autosave_interval = AUTOSAVE_INTERVAL
+        # Local version history of the open files, kept on its own worker thread
+        self.history = HistoryStore(os.path.join(self.settings_dir, "history.sqlite3"), self.root)
+        # Find in files runs in a process pool, started on the first search
+        self.file_search = FileSearch(self.root)
+        # Spelling is checked on a worker thread that reads the word list on its first check
+        self.spellchecker = SpellChecker(self.root, self.dictionary_path)
+        # Words of the open tabs for completion, counted on a worker thread when a tab loads
+        self.vocabulary = Vocabulary(self.root)
+        # Word, sentence and paragraph counts are computed on a worker thread
+        self.statistics_worker = StatisticsWorker(self.root)
+        self.find_in_files_window = None
+
+    def init_window(self):
         # Set dark theme
         self.style = ttk.Style()
         self.style.theme_use('clam')
         self.configure_dark_theme()
 
         # Create main frame
-        self.main_frame = ttk.Frame(root)
+        self.main_frame = ttk.Frame(self.root)
         self.main_frame.pack(fill="both", expand=True)
 
         # Create font size control frame above tabs
         self.create_font_size_control()
 
         # Dictionary to keep track of open files
-        self.tabs = {}
+        self.tabs = TabRegistry()
         self.current_file = None
 
         status_bar = ttk.Frame(self.main_frame)
@@ -68,10 +133,18 @@ class TextEditor:
         self.status_label = ttk.Label(status_bar, text="Радкоў: 0", font=("Arial", 18))
         self.status_label.pack(side="left", fill="x", padx=5, pady=5, expand=1)
 
+        # Document statistics, refreshed at most once a second while typing
+        self.stats_label = ttk.Label(status_bar, text="", font=("Arial", 12))
+        self.stats_label.pack(side="left", padx=5)
+
         # Add file path label
         self.file_path_label = ttk.Label(status_bar, text="", font=("Arial", 12))
         self.file_path_label.pack(side="left", padx=5)
 
+        # Progress of a save in progress
+        self.save_status_label = ttk.Label(status_bar, text="", font=("Arial", 12))
+        self.save_status_label.pack(side="left", padx=5)
+
         # Create notebook for tabs
         self.notebook = ttk.Notebook(self.main_frame)
         self.notebook.pack(fill="both", expand=True, padx=5, pady=5)
@@ -79,9 +152,18 @@ class TextEditor:
         # Add bindings for tab management
         self.notebook.bind("<Double-Button-1>", self.on_notebook_double_click)
 
-        # Create menu
-        self.create_menu()
+        # Find/replace bar, built the first time it is shown
+        self.find_bar = None
+        self.root.bind_all("<Control-f>", lambda event: self.show_find())
+        self.root.bind_all("<Control-h>", lambda event: self.show_find(replace=True))
+        self.root.bind_all("<<Find>>", lambda event: self.show_find())
+        self.root.bind_all("<<Replace>>", lambda event: self.show_find(replace=True))
+
+        # Live latency histograms, shown and hidden with Ctrl+Shift+F12
+        self.perf_overlay = PerfOverlay(self.root)
+        self.root.bind_all("<Control-Shift-F12>", lambda event: self.perf_overlay.toggle())
 
+    def init_tabs(self):
         # Setup autosave
         self.setup_autosave()
         self.create_fixed_tab()
@@ -95,16 +177,36 @@ class TextEditor:
 
         self.select_tab_and_set_cursor()
 
-        self.count_display_lines()
+        self.request_line_count()
+
+    def on_first_frame(self, event):
+        self.root.unbind("<Expose>")
+        self.profile.mark("first frame")
+        # Let the first frame finish drawing before the deferred work
+        self.root.after_idle(self.finish_startup)
+
+    def finish_startup(self):
+        with self.profile.phase("menu"):
+            self.create_menu()
+        with self.profile.phase("icons"):
+            self.load_icons()
+        self.profile.mark("startup finished")
+        self.profile.write(os.path.join(self.settings_dir, REPORT_FILE))
 
     def select_tab_and_set_cursor(self):
-        self.notebook.select(self.selected_tab_index)
-        filename = self.tabs[self.selected_tab_index]["filename"]
-        cursor_pos = self.cursor_positions.get(filename, "1.0")
-        text_widget = self.get_current_text_widget()
-        text_widget.focus_set()
-        text_widget.mark_set(tk.INSERT, cursor_pos)
-        text_widget.see(cursor_pos)
+        # The saved index is out of range if files went missing, fall back to the first tab
+        tab_id = self.tabs.id_at(self.selected_tab_index or 0)
+        if tab_id is None:
+            tab_id = self.tabs.id_at(0)
+        if tab_id is None:
+            return
+        self.notebook.select(self.tabs[tab_id]["frame"])
+        self.current_file = tab_id
+        self.file_path_label.config(text=self.tabs[tab_id]["filename"])
+        # Building the widget restores the cursor of a placeholder or hibernated tab
+        text_widget = self.load_tab(tab_id)
+        (text_widget or self.tabs[tab_id]["viewer"]).focus_set()
+        self.enforce_tab_budget()
 
     def configure_dark_theme(self):
         self.root.configure(bg=BG_COLOR)
@@ -131,6 +233,7 @@ class TextEditor:
         file_menu.add_command(label="Адкрыць", command=self.open_file)
         file_menu.add_command(label="Захаваць", command=self.save_file)
         file_menu.add_command(label="Захаваць як...", command=self.save_file_as)
+        file_menu.add_command(label="Гісторыя версій", command=self.show_history)
         file_menu.add_separator()
         file_menu.add_command(label="Выхад", command=self.on_window_close)
 
@@ -143,6 +246,13 @@ class TextEditor:
         edit_menu.add_command(label="Выразаць", command=self.cut)
         edit_menu.add_command(label="Капіраваць", command=self.copy)
         edit_menu.add_command(label="Уставіць", command=self.paste)
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Тыпаграфіка", command=self.typeset_document)
+        edit_menu.add_command(label="Праверка правапісу", command=self.toggle_spellcheck)
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Знайсці", command=self.show_find)
+        edit_menu.add_command(label="Замяніць", command=lambda: self.show_find(replace=True))
+        edit_menu.add_command(label="Шукаць ва ўсіх файлах", command=self.show_find_in_files)
 
     def create_font_size_control(self):
         # Create a frame for font size control
@@ -165,15 +275,16 @@ class TextEditor:
         self.font_size_display.pack(side="left", padx=5)
 
         # Undo/Redo button group
+        self.icons = []  # (blank image, file) filled in by load_icons
         undo_redo_frame = ttk.Frame(toolbar)
         undo_redo_frame.pack(side="left", padx=(40, 10))  # Padding to separate from next group
-        undo_image = PhotoImage(file="img/undo.png")
+        undo_image = self.toolbar_icon("img/undo.png")
         undo_button = tk.Button(undo_redo_frame, text="Адмяніць", image=undo_image, compound="top", bg=BG_COLOR, fg=FG_COLOR, activebackground=FG_COLOR,
                                 activeforeground=BG_COLOR, font=ICON_FONT, command=self.undo)
         undo_button.image = undo_image
         undo_button.pack(side="left", padx=0)
 
-        redo_image = PhotoImage(file="img/redo.png")
+        redo_image = self.toolbar_icon("img/redo.png")
         redo_button = tk.Button(undo_redo_frame, text="Паўтарыць", image=redo_image, compound="top", bg=BG_COLOR, fg=FG_COLOR, activebackground=FG_COLOR,
                                 activeforeground=BG_COLOR, font=ICON_FONT, command=self.redo)
         redo_button.image = redo_image
@@ -183,30 +294,47 @@ class TextEditor:
         clipboard_frame = ttk.Frame(toolbar)
         clipboard_frame.pack(side="left", padx=(0, 10))
 
-        cut_image = PhotoImage(file="img/cut.png")
+        cut_image = self.toolbar_icon("img/cut.png")
         cut_button = tk.Button(clipboard_frame, text="Выразаць", image=cut_image, compound="top", bg=BG_COLOR, fg=FG_COLOR, activebackground=FG_COLOR,
                                activeforeground=BG_COLOR, font=ICON_FONT, command=self.cut)
         cut_button.image = cut_image
         cut_button.pack(side="left", padx=0)
 
-        copy_image = PhotoImage(file="img/copy.png")
+        copy_image = self.toolbar_icon("img/copy.png")
         copy_button = tk.Button(clipboard_frame, text="Капіраваць", image=copy_image, compound="top", bg=BG_COLOR, fg=FG_COLOR, activebackground=FG_COLOR,
                                 activeforeground=BG_COLOR, font=ICON_FONT, command=self.copy)
         copy_button.image = copy_image
         copy_button.pack(side="left", padx=0)
 
-        paste_image = PhotoImage(file="img/paste.png")
+        paste_image = self.toolbar_icon("img/paste.png")
         paste_button = tk.Button(clipboard_frame, text="Уставіць", image=paste_image, compound="top", bg=BG_COLOR, fg=FG_COLOR, activebackground=FG_COLOR,
                                  activeforeground=BG_COLOR, font=ICON_FONT, command=self.paste)
         paste_button.image = paste_image
         paste_button.pack(side="left", padx=0)
 
-        spec_chars_image = PhotoImage(file="img/paragraph.png")
+        spec_chars_image = self.toolbar_icon("img/paragraph.png")
         spec_chars_button = tk.Button(toolbar, text="Спец. знакі", image=spec_chars_image, compound="top", bg=BG_COLOR, fg=FG_COLOR, activebackground=FG_COLOR,
                                       activeforeground=BG_COLOR, font=ICON_FONT, command=self.toggle_spec_chars)
         spec_chars_button.image = spec_chars_image
         spec_chars_button.pack(side="left", padx=(0, 10))
 
+    def toolbar_icon(self, path):
+        # A blank image keeps the toolbar its final size until the icon is read into it
+        image = tk.PhotoImage(width=ICON_SIZE, height=ICON_SIZE)
+        self.icons.append((image, path))
+        return image
+
+    def load_icons(self):
+        try:
+            self.root.iconbitmap("img/icon.ico")
+        except tk.TclError as e:
+            print(f"Error loading window icon: {e}")  # .ico files are only read on Windows
+        for image, path in self.icons:
+            try:
+                image.configure(file=path)
+            except tk.TclError as e:
+                print(f"Error loading icon {path}: {e}")
+
     def create_fixed_tab(self):
         fixed_frame = ttk.Frame(self.notebook)
         self.notebook.add(fixed_frame, text="+")
@@ -217,139 +345,312 @@ class TextEditor:
         selected_index = self.notebook.index("current")
         if selected_index == self.fixed_tab_index:
             self.create_new_tab()
-            if self.tabs:
-                self.notebook.select(len(self.tabs) - 1)
         else:
             # Update the file path label and selected tab index
-            tab_id = None
-            for tid, tab_info in self.tabs.items():
-                if self.notebook.index(tab_info["frame"]) == selected_index:
-                    tab_id = tid
-                    break
+            tab_id = self.tabs.id_at(selected_index)
             if tab_id is not None:
                 self.current_file = tab_id
                 file_path = self.tabs[tab_id]["filename"]
                 self.tabs[tab_id]["file_path_label"].config(text=file_path)
-                self.selected_tab_index = tab_id
+                self.selected_tab_index = selected_index
                 self.select_tab_and_set_cursor()
-            self.count_display_lines()
+                if self.find_bar is not None:
+                    self.find_bar.attach(self.tabs[tab_id]["text_widget"])
+            self.request_line_count()
 
-    def create_new_tab(self, filename=None, content=None, cursor_pos=None):
+    def create_new_tab(self, filename=None, content=None, cursor_pos=None, lazy=False):
+        # A lazy tab is a placeholder that builds its text widget when it is first selected
         content_frame = ttk.Frame(self.notebook)
         toolbar = ttk.Frame(content_frame)
         toolbar.pack(side="top", fill="x")
 
-        tab_id = len(self.tabs)
+        tab_id = None  # Assigned by the tab registry below, before the button can be pressed
         close_button = ttk.Button(toolbar, text="Закрыць", command=lambda: self.close_tab(tab_id))
         close_button.pack(side="right", padx=3)
 
-        text_frame = ttk.Frame(content_frame)
-        text_frame.pack(fill="both", expand=True)
-        scrollbar = ttk.Scrollbar(text_frame)
-        scrollbar.pack(side="right", fill="y")
-        text_widget = TextWidget(text_frame, yscrollcommand=scrollbar.set, wrap="word",
-                                 bg="#000000", fg="#FFFFFF", insertbackground="#e0e0e0",
-                                 selectbackground="#4a4a4a", selectforeground="#FFFFFF",
-                                 font=("Times New Roman", self.default_font_size, "bold"), spec_chars=self.show_special)
-        text_widget.pack(side="left", fill="both", expand=True)
-        text_widget.bind("<KeyRelease>", self.on_text_change)
-        scrollbar.config(command=text_widget.yview)
         if filename:
             tab_name = os.path.basename(filename)[:-4]
         else:
             tab_name = f"Новы{self.untitled_counter}"
             filename = os.path.join(self.autosave_dir, f"{tab_name}.txt")
             self.untitled_counter += 1
-        self.notebook.insert(self.fixed_tab_index, content_frame, text=tab_name)
+        position = len(self.tabs)  # New tabs go just before the "+" tab
+        self.notebook.insert(position, content_frame, text=tab_name)
         tab_info = {
-            "text_widget": text_widget,
+            "text_widget": None,  # None while the tab is a placeholder or hibernated
+            "text_frame": None,
             "filename": filename,
             "frame": content_frame,
+            "toolbar": toolbar,
             "autosave_filename": filename if not os.path.exists(filename) else None,
-            "file_path_label": self.file_path_label
+            "file_path_label": self.file_path_label,
+            "line_counter": None,
+            "statistics": None,
+            # Edit generation last handed to autosave; -1 makes a new untitled tab save once
+            "autosaved_generation": -1 if not os.path.exists(filename) else 0,
+            "content_hash": None,  # Hash and length of the text last read from or written to the file
+            "content_length": None,
+            "history_time": None,  # When a version of the tab was last recorded in the history
+            "journal": None,
+            "loader": None,  # FileLoader while a large file is still being read
+            "load_widgets": (),  # Progress bar and cancel button shown while loading
+            "saving": None,  # StreamingSave while the tab is being written
+            "viewer": None,  # MmapViewer of a file too big to edit, the tab then has no text widget
+            "cursor_pos": cursor_pos,  # Cursor to restore when the widget is built
+            "last_used": time.monotonic()
         }
-        self.tabs[tab_id] = tab_info
-        if content:
-            text_widget.delete(1.0, tk.END)
-            text_widget.insert(tk.END, content)
-        if cursor_pos:
-            text_widget.focus_set()
-            text_widget.mark_set(tk.INSERT, cursor_pos)
-        self.notebook.select(tab_id)
+        tab_id = self.tabs.add(tab_info, position)
+        self.fixed_tab_index = len(self.tabs)
+        if lazy:
+            return tab_id
+
+        self.load_tab(tab_id, content)
+        self.notebook.select(content_frame)
         self.current_file = tab_id
         # Update file path label for the new tab
         self.file_path_label.config(text=filename)
-        self.count_display_lines()
-
-        # Update fixed tab index since tab list changed
-        self.fixed_tab_index = self.notebook.index("end") - 1
+        self.request_line_count()
         self.save_settings()
+        self.enforce_tab_budget()
         return tab_id
 
+    @timed("load_tab")
+    def load_tab(self, tab_id, content=None):
+        # Build the text widget of a placeholder or hibernated tab; content is read from the file if not given
+        tab_info = self.tabs[tab_id]
+        tab_info["last_used"] = time.monotonic()
+        if tab_info["text_widget"] is not None or tab_info["viewer"] is not None:
+            return tab_info["text_widget"]
+        filename = tab_info["filename"]
+        if os.path.exists(filename) and os.path.getsize(filename) > self.viewer_threshold_mb * 1024 * 1024:
+            # Too big for a Text widget: show it read-only, a screenful at a time
+            viewer = MmapViewer(tab_info["frame"], filename, font=("Times New Roman", self.default_font_size, "bold"),
+                                bg="#000000", fg="#FFFFFF", selectbackground="#4a4a4a", selectforeground="#FFFFFF")
+            viewer.pack(fill="both", expand=True)
+            tab_info["viewer"] = viewer
+            return None
+
+        text_frame = ttk.Frame(tab_info["frame"])
+        text_frame.pack(fill="both", expand=True)
+        scrollbar = ttk.Scrollbar(text_frame)
+        scrollbar.pack(side="right", fill="y")
+        text_widget = TextWidget(text_frame, yscrollcommand=scrollbar.set, wrap="word",
+                                 bg="#000000", fg="#FFFFFF", insertbackground="#e0e0e0",
+                                 selectbackground="#4a4a4a", selectforeground="#FFFFFF",
+                                 font=("Times New Roman", self.default_font_size, "bold"), spec_chars=self.show_special,
+                                 scheduler=self.scheduler, undo_budget=self.undo_budget_mb * 1024 * 1024,
+                                 spellchecker=self.spellchecker if self.spellcheck else None,
+                                 vocabulary=self.vocabulary)
+        text_widget.pack(side="left", fill="both", expand=True)
+        text_widget.bind("<KeyRelease>", self.on_text_change, add="+")
+        # Tk's own Control-f/Control-h bindings move the cursor and delete a character
+        text_widget.bind("<Control-f>", lambda event: self.show_find())
+        text_widget.bind("<Control-h>", lambda event: self.show_find(replace=True))
+        scrollbar.config(command=text_widget.yview)
+        tab_info["text_widget"] = text_widget
+        tab_info["text_frame"] = text_frame
+        tab_info["line_counter"] = LineCounter(text_widget)
+        tab_info["statistics"] = DocumentStatistics(text_widget, self.statistics_worker)
+
+        if content is None and os.path.exists(filename):
+            self.writer.wait_for(filename)  # The file may still be written by hibernation or autosave
+            try:
+                if os.path.getsize(filename) > SYNC_LOAD_LIMIT:
+                    self.start_loading(tab_id)
+                    return text_widget
+                with open(filename, "r", encoding="utf-8") as f:
+                    content = f.read()
+            except Exception as e:
+                self.on_load_failed(tab_id, e)
+                return text_widget
+        if content:
+            # Loading a document is not an edit the user can undo
+            text_widget.bulk_insert("1.0", content, undoable=False)
+        self.finish_loading(tab_id)
+        return text_widget
+
+    def start_loading(self, tab_id):
+        # Read a large file on a worker thread; the widget stays read-only until it is complete
+        tab_info = self.tabs[tab_id]
+        text_widget = tab_info["text_widget"]
+        text_widget.read_only = True
+        loader = FileLoader(tab_info["filename"], text_widget,
+                            lambda done, total: self.on_load_progress(tab_id, done),
+                            lambda error: self.on_loaded(tab_id, error))
+        progress = ttk.Progressbar(tab_info["toolbar"], maximum=max(loader.size, 1), length=300)
+        progress.pack(side="left", padx=3)
+        cancel_button = ttk.Button(tab_info["toolbar"], text="Спыніць", command=lambda: self.cancel_loading(tab_id))
+        cancel_button.pack(side="left", padx=3)
+        tab_info["loader"] = loader
+        tab_info["load_widgets"] = (progress, cancel_button)
+        loader.start()
+
+    def on_load_progress(self, tab_id, done):
+        if tab_id in self.tabs and self.tabs[tab_id]["loader"] is not None:
+            self.tabs[tab_id]["load_widgets"][0].config(value=done)
+
+    def on_loaded(self, tab_id, error):
+        tab_info = self.tabs[tab_id]
+        tab_info["loader"] = None
+        for widget in tab_info["load_widgets"]:
+            widget.destroy()
+        tab_info["load_widgets"] = ()
+        if error is not None:
+            self.on_load_failed(tab_id, error)
+            return
+        text_widget = tab_info["text_widget"]
+        text_widget.read_only = False
+        self.finish_loading(tab_id)
+        self.request_line_count()
+
+    def cancel_loading(self, tab_id):
+        # Closing the tab without writing anything, the file on disk is left as it is
+        tab_info = self.tabs[tab_id]
+        tab_info["loader"].cancel()
+        self.remove_tab(tab_id)
+
+    def on_load_failed(self, tab_id, error):
+        # A tab whose file cannot be read is closed, so that its empty text never overwrites the file
+        from tkinter import messagebox  # Dialogs are imported when first used, not at startup
+        messagebox.showerror("Error", f"Could not open file: {str(error)}")
+        self.root.after_idle(lambda: self.remove_tab(tab_id))
+
+    def finish_loading(self, tab_id):
+        # The widget holds the file now: start journaling and restore the cursor
+        tab_info = self.tabs[tab_id]
+        text_widget = tab_info["text_widget"]
+        if os.path.exists(tab_info["filename"]):
+            tab_info["autosaved_generation"] = text_widget.edit_generation  # Same as on disk
+            tab_info["content_hash"] = text_widget.document.digest()
+            tab_info["content_length"] = text_widget.document.length
+        tab_info["journal"] = Journal(journal_path(self.autosave_dir, tab_info["filename"]), text_widget,
+                                      self.writer, self.scheduler)
+        # Recover edits journaled after the last snapshot of a session that did not close cleanly
+        if tab_info["journal"].replay(text_widget.document.digest()):
+            self.autosave_tab(tab_id)
+        else:
+            tab_info["journal"].restart(text_widget.document.digest())
+        # Count the words of the tab for completion, then follow its edits; a hibernated tab kept its counts
+        text_widget.edit_listeners.append(self.vocabulary.listener(tab_id, text_widget.document))
+        self.vocabulary.scan(tab_id, text_widget.document)
+        if tab_info["cursor_pos"]:
+            text_widget.mark_set(tk.INSERT, tab_info["cursor_pos"])
+            text_widget.see(tab_info["cursor_pos"])
+
+    def hibernate_tab(self, tab_id):
+        # Save the tab and destroy its widget, keeping only what is needed to build it again
+        tab_info = self.tabs[tab_id]
+        text_widget = tab_info["text_widget"]
+        if tab_info["journal"] is None:
+            return  # Not loaded yet
+        self.autosave_tab(tab_id, wait=True)
+        tab_info["cursor_pos"] = text_widget.index(tk.INSERT)
+        tab_info["journal"].discard()  # The snapshot just taken holds every edit
+        tab_info["text_frame"].destroy()
+        tab_info.update(text_widget=None, text_frame=None, line_counter=None, statistics=None, journal=None)
+
+    def enforce_tab_budget(self):
+        # Hibernate tabs unused for too long, then the least recently used ones over the budget
+        now = time.monotonic()
+        live = sorted((tab_info["last_used"], tab_id) for tab_id, tab_info in self.tabs.items()
+                      if tab_info["journal"] is not None and tab_id != self.current_file)
+        excess = len(live) + 1 - self.max_live_tabs
+        for last_used, tab_id in live:
+            if excess > 0 or now - last_used > self.hibernate_after_minutes * 60:
+                self.hibernate_tab(tab_id)
+                excess -= 1
+
     def toggle_spec_chars(self):
         self.show_special = not self.show_special
-        text_widget = self.get_current_text_widget()
-        text_widget.toggle_spec_chars(self.show_special)
+        # Markers are drawn only for the visible lines, so every tab can follow the toggle
+        for tab_info in self.tabs.values():
+            if tab_info["text_widget"] is not None:
+                tab_info["text_widget"].toggle_spec_chars(self.show_special)
+        self.save_settings()
+
+    def toggle_spellcheck(self):
+        self.spellcheck = not self.spellcheck
+        for tab_info in self.tabs.values():
+            if tab_info["text_widget"] is not None:
+                tab_info["text_widget"].set_spellchecker(self.spellchecker if self.spellcheck else None)
+        self.save_settings()
 
     def get_current_text_widget(self) -> TextWidget | None:
         if self.current_file is not None:
             return self.tabs[self.current_file]["text_widget"]
         return None
 
+    @timed("count_display_lines")
     def count_display_lines(self):
-        tab_id = self.notebook.index(self.notebook.select())
-        text_widget = self.tabs[tab_id]["text_widget"]
-        text_widget.update_idletasks()
-
-        text_font = tkfont.Font(font=text_widget['font'])
-        widget_width_px = text_widget.winfo_width()
-        avg_char_width = text_font.measure("n")
-        chars_per_line = max(widget_width_px // avg_char_width, 1)
-        full_text = text_widget.get("1.0", "end-1c")
-        # Split into logical lines
-        logical_lines = full_text.split("\n")
-
-        # Estimate total visual lines using word wrap
-        total_visual_lines = 0
-        for line in logical_lines:
-            wrapped = textwrap.wrap(line, width=chars_per_line) or [""]
-            total_visual_lines += len(wrapped)
+        tab_id = self.tabs.id_of_frame(self.notebook.select())
+        if tab_id is not None and self.tabs[tab_id]["viewer"] is not None:
+            total_lines = self.tabs[tab_id]["viewer"].total_lines
+            self.status_label.config(text=f"Радкоў: {total_lines if total_lines is not None else '…'}")
+            return total_lines or 0
+        if tab_id is None or self.tabs[tab_id]["line_counter"] is None:
+            return 0
+        total_visual_lines = self.tabs[tab_id]["line_counter"].count()
 
         lines_text = f"Радкоў: {total_visual_lines}"
         self.status_label.config(text=lines_text)
 
         return total_visual_lines
 
+    def request_line_count(self):
+        # A burst of edits costs one recount
+        self.scheduler.schedule("count_lines", self.count_display_lines, delay=100, max_delay=500)
+        self.scheduler.schedule("statistics", self.refresh_statistics, delay=500, max_delay=1000)
+
+    def refresh_statistics(self):
+        tab_id = self.tabs.id_of_frame(self.notebook.select())
+        if tab_id is None or self.tabs[tab_id]["statistics"] is None:
+            self.stats_label.config(text="")
+            return
+        self.tabs[tab_id]["statistics"].refresh(lambda summary: self.show_statistics(tab_id, summary))
+
+    def show_statistics(self, tab_id, summary):
+        if self.tabs.id_of_frame(self.notebook.select()) != tab_id:
+            return  # Another tab was selected meanwhile
+        words, characters, sentences, paragraphs, minutes = summary
+        self.stats_label.config(text=f"Слоў: {words}  Знакаў: {characters}  Сказаў: {sentences}  "
+                                     f"Абзацаў: {paragraphs}  Чытанне: {minutes} хв")
+
     def on_text_change(self, event=None):
-        self.count_display_lines()
+        self.request_line_count()
 
     def open_file(self):
+        from tkinter import filedialog
         filename = filedialog.askopenfilename(
             filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
         )
         if filename:
-            # Check if file is already open
-            for tab_id, tab_info in self.tabs.items():
-                if tab_info["filename"] == filename:
-                    self.notebook.select(tab_id)
-                    self.current_file = tab_id
-                    tab_info["file_path_label"].config(text=filename)
-                    self.save_settings()
-                    return
-
-            # Create new tab with file content
-            try:
-                with open(filename, "r", encoding="utf-8") as file:
-                    content = file.read()
-                tab_id = self.create_new_tab(filename)
-                text_widget = self.tabs[tab_id]["text_widget"]
-                text_widget.delete(1.0, tk.END)
-                text_widget.insert(tk.END, content)
+            self.open_path(filename)
+
+    def open_path(self, filename):
+        # Check if file is already open
+        for tab_id, tab_info in self.tabs.items():
+            if os.path.abspath(tab_info["filename"]) == os.path.abspath(filename):
+                self.notebook.select(tab_info["frame"])
                 self.current_file = tab_id
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not open file: {str(e)}")
+                tab_info["file_path_label"].config(text=filename)
+                self.save_settings()
+                return
+
+        # Create new tab, large files are loaded in the background
+        self.create_new_tab(filename)
+
+    def open_paths(self, paths):
+        # Files passed on the command line, here or to a later launch that handed them over
+        for path in paths:
+            if os.path.isfile(path):
+                self.open_path(path)
+            else:
+                print(f"Error opening {path}: not a file")
+        self.root.deiconify()
+        self.root.lift()
+        self.root.focus_force()
 
-    def save_file(self):
+    def save_file(self, wait=False):
         if self.current_file is None:
             return None
 
@@ -358,19 +659,35 @@ class TextEditor:
 
         if not filename:
             return self.save_file_as()
+        from tkinter import messagebox
+        if tab_info["viewer"] is not None:
+            messagebox.showinfo("Захаваць", "Файл адкрыты толькі для чытання")
+            return False
+        if tab_info["journal"] is None:
+            messagebox.showinfo("Захаваць", "Файл яшчэ загружаецца")
+            return False
 
-        try:
-            content = tab_info["text_widget"].get("1.0", "end-1c")
-            with open(filename, "w", encoding="utf-8") as file:
-                file.write(content)
-            return True
-        except Exception as e:
+        errors = []
+
+        def on_error(e):
+            errors.append(e)
             messagebox.showerror("Error", f"Could not save file: {str(e)}")
-            return False
 
-    def save_file_as(self):
+        self.write_tab(self.current_file, wait=wait, force_history=True, on_error=on_error)
+        return not errors
+
+    def save_file_as(self, wait=False):
         if self.current_file is None:
             return None
+        from tkinter import filedialog, messagebox
+        # Refused before the tab or any file is touched
+        if self.tabs[self.current_file]["viewer"] is not None:
+            messagebox.showinfo("Захаваць як", "Файл адкрыты толькі для чытання")
+            return False
+        if self.tabs[self.current_file]["loader"] is not None or self.tabs[self.current_file]["journal"] is None:
+            # A draft still being read must not be removed or renamed under the loader
+            messagebox.showinfo("Захаваць як", "Файл яшчэ загружаецца")
+            return False
         filename = filedialog.asksaveasfilename(
             defaultextension=".txt",
             filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
@@ -382,6 +699,7 @@ class TextEditor:
         # Check if this was an autosaved file
         old_filename = tab_info["filename"]
         if old_filename and os.path.dirname(old_filename) == self.autosave_dir:
+            self.writer.wait()  # A pending autosave must not recreate the file
             try:
                 os.remove(old_filename)
             except OSError as e:
@@ -389,20 +707,21 @@ class TextEditor:
                 pass
         tab_info["filename"] = filename
         tab_info["autosave_filename"] = None  # No longer an autosave file
+        tab_info.update(content_hash=None, content_length=None)  # Nothing is written to the new file yet
+        tab_info["journal"].retarget(journal_path(self.autosave_dir, filename))
 
         # Update tab name and file path label
-        tab_index = self.notebook.index(self.notebook.select())
-        self.notebook.tab(tab_index, text=os.path.basename(filename))
+        self.notebook.tab(tab_info["frame"], text=os.path.basename(filename))
         tab_info["file_path_label"].config(text=filename)
-        return self.save_file()
+        return self.save_file(wait)
 
     def cut(self):
         text_widget = self.get_current_text_widget()
         if text_widget:
             if text_widget.tag_ranges(tk.SEL):
                 self.copy()
-                text_widget.delete(tk.SEL_FIRST, tk.SEL_LAST)
-                self.count_display_lines()
+                text_widget.delete_selection()
+                self.request_line_count()
 
     def copy(self):
         text_widget = self.get_current_text_widget()
@@ -418,20 +737,143 @@ class TextEditor:
         if text_widget:
             try:
                 clipboard_data = self.root.clipboard_get()
-                if text_widget.tag_ranges(tk.SEL):
-                    text_widget.delete(tk.SEL_FIRST, tk.SEL_LAST)
-                text_widget.insert(tk.INSERT, clipboard_data)
-                self.count_display_lines()
+                text_widget.paste_text(clipboard_data)
+                self.request_line_count()
             except tk.TclError:
                 # Clipboard is empty or unavailable; ignore
                 pass
 
+    def typeset_document(self):
+        text_widget = self.get_current_text_widget()
+        if text_widget:
+            text_widget.typeset_all()
+            self.request_line_count()
+
+    def show_find(self, replace=False):
+        if self.find_bar is None:
+            # Shown above the status bar
+            self.find_bar = FindBar(self.main_frame, self.scheduler, on_replaced=self.request_line_count)
+        self.find_bar.show(self.get_current_text_widget(), replace, before=self.notebook)
+        return "break"
+
+    def search_sources(self):
+        # Clean tabs and autosave drafts are read from disk, tabs with unsaved edits from their text
+        sources = []
+        seen = set()
+        for tab_info in self.tabs.values():
+            path = os.path.abspath(tab_info["filename"])
+            seen.add(path)
+            text_widget = tab_info["text_widget"]
+            if tab_info["journal"] is not None and (tab_info["saving"] is not None or
+                                                    text_widget.edit_generation != tab_info["autosaved_generation"]):
+                sources.append((path, text_widget.document.text()))
+            elif os.path.exists(path):
+                sources.append((path, None))
+        for name in sorted(os.listdir(self.autosave_dir)):
+            path = os.path.abspath(os.path.join(self.autosave_dir, name))
+            if name.endswith(".txt") and path not in seen:
+                sources.append((path, None))
+        return sources
+
+    def show_find_in_files(self):
+        if self.find_in_files_window is not None and self.find_in_files_window.winfo_exists():
+            self.find_in_files_window.lift()
+            return
+        window = tk.Toplevel(self.root, bg=BG_COLOR)
+        window.title("Пошук ва ўсіх файлах")
+        self.find_in_files_window = window
+        query_row = ttk.Frame(window)
+        query_row.pack(fill="x", padx=5, pady=5)
+        query_var = tk.StringVar()
+        regex_var = tk.BooleanVar(value=False)
+        case_var = tk.BooleanVar(value=False)
+        query_entry = ttk.Entry(query_row, textvariable=query_var, width=40, font=("Arial", 12))
+        query_entry.pack(side="left", padx=5)
+        ttk.Checkbutton(query_row, text="Рэгулярны выраз", variable=regex_var).pack(side="left", padx=5)
+        ttk.Checkbutton(query_row, text="Улічваць рэгістр", variable=case_var).pack(side="left", padx=5)
+        status_label = ttk.Label(window, text="", font=("Arial", 12))
+        listbox = tk.Listbox(window, bg=BG_COLOR, fg=FG_ACTIVE, selectbackground=BG_ACTIVE,
+                             font=("Arial", 12), width=100, height=25)
+        results = []  # (path, line, start, end) of every listbox row, a file row goes to its first match
+        totals = {"files": 0, "matches": 0}
+
+        def on_result(path, matches):
+            listbox.insert("end", f"{path} ({len(matches)})")
+            results.append((path, matches[0][0], matches[0][1], matches[0][2]))
+            for line, start, end, text in matches:
+                listbox.insert("end", f"    {line}: {text}")
+                results.append((path, line, start, end))
+            totals["files"] += 1
+            totals["matches"] += len(matches)
+            status_label.config(text=f"Знойдзена: {totals['matches']}…")
+
+        def on_done():
+            status_label.config(text=f"Супадзенняў: {totals['matches']}, файлаў: {totals['files']}")
+
+        def search(event=None):
+            query = query_var.get()
+            if not query:
+                return
+            try:
+                compile_query(query, regex_var.get(), case_var.get())
+            except re.error as e:
+                status_label.config(text=f"Памылка ў выразе: {e}")
+                return
+            listbox.delete(0, "end")
+            results.clear()
+            totals.update(files=0, matches=0)
+            status_label.config(text="Пошук…")
+            self.file_search.start(self.search_sources(), query, regex_var.get(), case_var.get(),
+                                   lambda path, matches: window.winfo_exists() and on_result(path, matches),
+                                   lambda: window.winfo_exists() and on_done())
+
+        def open_result(event=None):
+            selection = listbox.curselection()
+            if selection:
+                self.open_search_result(*results[selection[0]])
+
+        def close():
+            self.file_search.cancel()
+            window.destroy()
+
+        ttk.Button(query_row, text="Шукаць", command=search).pack(side="left", padx=5)
+        status_label.pack(fill="x", padx=5)
+        listbox.pack(fill="both", expand=True, padx=5, pady=5)
+        query_entry.bind("<Return>", search)
+        listbox.bind("<Double-Button-1>", open_result)
+        listbox.bind("<Return>", open_result)
+        window.protocol("WM_DELETE_WINDOW", close)
+        query_entry.focus_set()
+
+    def open_search_result(self, path, line, start, end):
+        tab_id = next((tab_id for tab_id, tab_info in self.tabs.items()
+                       if os.path.abspath(tab_info["filename"]) == path), None)
+        if tab_id is None:
+            if not os.path.exists(path):
+                return
+            tab_id = self.create_new_tab(path, cursor_pos=f"{line}.{start}")
+        tab_info = self.tabs[tab_id]
+        # A tab without a widget, or still loading, puts the cursor there once the file is in
+        tab_info["cursor_pos"] = f"{line}.{start}"
+        self.notebook.select(tab_info["frame"])
+        self.current_file = tab_id
+        self.selected_tab_index = self.tabs.position_of(tab_id)
+        text_widget = self.load_tab(tab_id)
+        if text_widget is None or tab_info["journal"] is None:
+            return
+        text_widget.tag_remove(tk.SEL, "1.0", "end")
+        text_widget.tag_add(tk.SEL, f"{line}.{start}", f"{line}.{end}")
+        text_widget.mark_set(tk.INSERT, f"{line}.{start}")
+        text_widget.see(tk.INSERT)
+        text_widget.focus_set()
+        self.save_settings()
+
     def undo(self):
         text_widget = self.get_current_text_widget()
         if text_widget:
             try:
                 text_widget.undo()
-                self.count_display_lines()
+                self.request_line_count()
             except tk.TclError:
                 # No more undo actions available; ignore
                 pass
@@ -441,7 +883,7 @@ class TextEditor:
         if text_widget:
             try:
                 text_widget.redo()
-                self.count_display_lines()
+                self.request_line_count()
             except tk.TclError:
                 # No more redo actions available; ignore
                 pass
@@ -449,15 +891,19 @@ class TextEditor:
     def load_settings(self):
         # Load settings from file
         try:
-            if os.path.exists(self.settings_file):
-                with open(self.settings_file, 'r', encoding="utf-8") as f:
-                    settings = json.load(f)
-                    self.default_font_size = settings.get('font_size', self.default_font_size)
-                    self.untitled_counter = settings.get('untitled_counter', 1)
-                    self.open_tabs = settings.get('open_tabs', [])
-                    self.cursor_positions = settings.get('cursor_positions', {})
-                    self.selected_tab_index = settings.get('selected_tab_index', None)
-                    self.show_special = settings.get('show_special', False)
+            settings = self.settings.load()
+            self.default_font_size = settings.get('font_size', self.default_font_size)
+            self.untitled_counter = settings.get('untitled_counter', 1)
+            self.open_tabs = settings.get('open_tabs', [])
+            self.cursor_positions = settings.get('cursor_positions', {})
+            self.selected_tab_index = settings.get('selected_tab_index', None)
+            self.show_special = settings.get('show_special', False)
+            self.spellcheck = settings.get('spellcheck', True)
+            self.dictionary_path = settings.get('dictionary_path', self.dictionary_path)
+            self.undo_budget_mb = settings.get('undo_budget_mb', self.undo_budget_mb)
+            self.max_live_tabs = max(1, settings.get('max_live_tabs', self.max_live_tabs))
+            self.hibernate_after_minutes = settings.get('hibernate_after_minutes', self.hibernate_after_minutes)
+            self.viewer_threshold_mb = settings.get('viewer_threshold_mb', self.viewer_threshold_mb)
         except Exception as e:
             print(f"Error loading settings: {e}")
             self.open_tabs = []
@@ -465,92 +911,207 @@ class TextEditor:
             self.selected_tab_index = None
 
     def save_settings(self):
-        # Save settings to file, including open tabs and selected tab index
+        # Only marks the settings dirty, bursts of changes (slider drags, restoring tabs) cause one write
+        self.settings.mark_dirty()
+
+    def write_settings(self):
+        # Write the settings now, cursor positions may have changed without marking them dirty
         try:
-            # Get current open tabs in order
-            open_tabs = []
-            cursor_positions = {}
-            for i in range(self.notebook.index("end") - 1):
-                tab_id = None
-                for tid, tab_info in self.tabs.items():
-                    if self.notebook.index(tab_info["frame"]) == i:
-                        tab_id = tid
-                        break
-                if tab_id is not None:
-                    filename = self.tabs[tab_id]["filename"]
-                    open_tabs.append(filename)
-                    cursor_positions[filename] = self.tabs[tab_id]["text_widget"].index(tk.INSERT)
-            settings = {
-                'font_size': self.default_font_size,
-                'untitled_counter': self.untitled_counter,
-                'open_tabs': open_tabs,
-                'cursor_positions': cursor_positions,
-                'selected_tab_index': self.notebook.index("current"),
-                'show_special': self.show_special
-            }
-            with open(self.settings_file, 'w', encoding="utf-8") as f:
-                json.dump(settings, f, indent=2)
+            self.settings.flush(force=True)
         except Exception as e:
             print(f"Error saving settings: {e}")
 
+    def collect_settings(self):
+        # Current settings, including open tabs in notebook order and the selected tab index
+        open_tabs = []
+        cursor_positions = {}
+        for tab_info in self.tabs.values():
+            filename = tab_info["filename"]
+            open_tabs.append(filename)
+            if tab_info["journal"] is not None:
+                cursor_positions[filename] = tab_info["text_widget"].index(tk.INSERT)
+            elif tab_info["cursor_pos"]:
+                cursor_positions[filename] = tab_info["cursor_pos"]
+        return {
+            'font_size': self.default_font_size,
+            'untitled_counter': self.untitled_counter,
+            'open_tabs': open_tabs,
+            'cursor_positions': cursor_positions,
+            'selected_tab_index': self.tabs.position_of(self.current_file) if self.current_file in self.tabs else None,
+            'show_special': self.show_special,
+            'spellcheck': self.spellcheck,
+            'dictionary_path': self.dictionary_path,
+            'undo_budget_mb': self.undo_budget_mb,
+            'max_live_tabs': self.max_live_tabs,
+            'hibernate_after_minutes': self.hibernate_after_minutes,
+            'viewer_threshold_mb': self.viewer_threshold_mb
+        }
+
     # noinspection PyTypeChecker
     def setup_autosave(self):
-        # Set up autosave to run every 30 seconds
-        self.autosave()
-        self.root.after(30000, self.setup_autosave)
         self.root.protocol("WM_DELETE_WINDOW", self.on_window_close)
+        self.run_autosave()
+
+    def run_autosave(self):
+        # Autosave more often while the user is typing fast and back off while idle
+        edits = self.autosave()
+        self.enforce_tab_budget()
+        self.autosave_interval = next_interval(self.autosave_interval, edits)
+        self.root.after(self.autosave_interval, self.run_autosave)
 
     def on_window_close(self):
-        self.autosave()
-        self.save_settings()
+        self.autosave(wait=True)
+        self.write_settings()
+        self.perf_log.dump()
+        self.writer.wait()
+        self.history.wait()
+        self.file_search.shutdown()
         self.root.destroy()
 
-    def autosave(self):
-        # Save all tabs
+    @timed("autosave")
+    def autosave(self, wait=False):
+        # Save tabs changed since the last autosave, returns the number of edits saved
+        edits = 0
         for tab_id, tab_info in self.tabs.items():
-            self.autosave_tab(tab_id)
+            edits += self.autosave_tab(tab_id, wait)
+        return edits
 
-    def autosave_tab(self, tab_id):
+    def autosave_tab(self, tab_id, wait=False):
+        # With wait the tab is on disk when this returns, e.g. before its widget is destroyed
         tab_info = self.tabs[tab_id]
-        filename = tab_info["filename"]
-
-        # Get content without trailing newline
-        content = tab_info["text_widget"].get("1.0", "end-1c")
+        text_widget = tab_info["text_widget"]
+        if tab_info["journal"] is None:
+            return 0  # Placeholder, hibernated and still loading tabs are already on disk
+        if tab_info["saving"] is not None:
+            if not wait:
+                return 0  # The next autosave picks up what the save in progress misses
+            tab_info["saving"].complete()
+        generation = text_widget.edit_generation
+        if generation == tab_info["autosaved_generation"]:
+            return 0
+        edits = generation - max(tab_info["autosaved_generation"], 0)
+        # Edits that cancel out (a character typed and deleted) leave the file as it is; only a document
+        # of the saved length is hashed to find out
+        document = text_widget.document
+        if document.length == tab_info["content_length"] and document.digest() == tab_info["content_hash"]:
+            tab_info["autosaved_generation"] = generation
+            tab_info["journal"].restart(tab_info["content_hash"])
+            return 0
+        self.write_tab(tab_id, wait=wait)
+        return edits
+
+    def write_tab(self, tab_id, wait=False, force_history=False, on_error=None):
+        # Stream the tab into its file; the journal restarts and the history records it once it is written
+        tab_info = self.tabs[tab_id]
+        if tab_info["saving"] is not None:
+            tab_info["saving"].complete()  # Saves of one tab must not overlap
+        text_widget = tab_info["text_widget"]
+        # The save writes a snapshot taken now; edits made while it runs stay dirty for the next autosave
+        tab_info["autosaved_generation"] = text_widget.edit_generation
+        length = text_widget.document.length
+        tab_info["journal"].begin_snapshot()
+
+        def on_progress(done, total):
+            self.save_status_label.config(text=f"Захаванне: {done * 100 // total}%")
+
+        def on_done(digest):
+            tab_info["saving"] = None
+            tab_info["content_hash"] = digest
+            tab_info["content_length"] = length
+            self.save_status_label.config(text="")
+            tab_info["journal"].restart(digest)
+            self.record_version(tab_info, force=force_history)
+
+        def on_failed(e):
+            tab_info["saving"] = None
+            tab_info["journal"].abort_snapshot()
+            tab_info["autosaved_generation"] = -1  # Try again on the next autosave
+            self.save_status_label.config(text="")
+            if on_error:
+                on_error(e)
+            else:
+                print(f"Error saving {tab_info['filename']}: {e}")
 
-        # Save to file
+        save = StreamingSave(text_widget, tab_info["filename"], self.writer, on_progress, on_done, on_failed)
+        tab_info["saving"] = save
         try:
-            with open(filename, 'w', encoding="utf-8") as f:
-                f.write(content)
+            save.start(wait)
         except Exception as e:
-            print(f"Error autosaving tab {tab_id}: {e}")
+            on_failed(e)
+
+    def record_version(self, tab_info, content=None, force=False):
+        # Keep a version in the local history at most every HISTORY_INTERVAL seconds unless forced.
+        # Without content the version is read back from the file once the writer has saved it.
+        now = time.monotonic()
+        if force or tab_info["history_time"] is None or now - tab_info["history_time"] >= HISTORY_INTERVAL:
+            tab_info["history_time"] = now
+            path = os.path.abspath(tab_info["filename"])
+            if content is None:
+                self.writer.submit(self.history.submit, self.history.add_version_from_file, path)
+            else:
+                self.history.submit(self.history.add_version, path, content)
+
+    def show_history(self):
+        if self.current_file is None:
+            return
+        tab_id = self.current_file
+        path = os.path.abspath(self.tabs[tab_id]["filename"])
+        self.history.request(lambda versions: self.open_history_window(tab_id, path, versions),
+                             self.history.list_versions, path)
+
+    def open_history_window(self, tab_id, path, versions):
+        if versions is None or tab_id not in self.tabs:
+            return
+        if not versions:
+            from tkinter import messagebox
+            messagebox.showinfo("Гісторыя версій", "Захаваных версій яшчэ няма")
+            return
+        window = tk.Toplevel(self.root, bg=BG_COLOR)
+        window.title(f"Гісторыя версій: {os.path.basename(path)}")
+        listbox = tk.Listbox(window, bg=BG_COLOR, fg=FG_ACTIVE, selectbackground=BG_ACTIVE,
+                             font=LABEL_FONT, width=40, height=15)
+        listbox.pack(fill="both", expand=True, padx=5, pady=5)
+        for version_id, created, size in versions:
+            listbox.insert("end", f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created))}  ({size} знакаў)")
+
+        def restore(event=None):
+            selection = listbox.curselection()
+            if not selection:
+                return
+            version_id = versions[selection[0]][0]
+            self.history.request(lambda content: self.restore_version(tab_id, content),
+                                 self.history.get_version, path, version_id)
+            window.destroy()
+
+        listbox.bind("<Double-Button-1>", restore)
+        ttk.Button(window, text="Аднавіць", command=restore).pack(pady=5)
+
+    def restore_version(self, tab_id, content):
+        if content is None or tab_id not in self.tabs:
+            return
+        tab_info = self.tabs[tab_id]
+        text_widget = self.load_tab(tab_id)
+        if text_widget is None or tab_info["journal"] is None:
+            return  # Read-only viewer or still loading
+        # Keep the current text in the history too, so restoring can be taken back later
+        self.record_version(tab_info, text_widget.document.text(), force=True)
+        text_widget.bulk_replace("1.0", "end-1c", content)  # A single undo step
+        self.request_line_count()
 
     def load_tabs(self):
         # Load tabs from settings.json
         try:
-            tab_ids = {}
-            # Load open tabs from settings
+            # Tabs are restored as placeholders, a file is read when its tab is first selected
             for filename in self.open_tabs:
                 if os.path.exists(filename):
-                    try:
-                        with open(filename, 'r', encoding="utf-8") as f:
-                            content = f.read()
-                        cursor_pos = self.cursor_positions.get(filename, "1.0")
-                        tab_id = self.create_new_tab(filename, content, cursor_pos)
-                        tab_ids[filename] = tab_id
-                    except Exception as e:
-                        print(f"Error loading tab {filename}: {e}")
+                    cursor_pos = self.cursor_positions.get(filename, "1.0")
+                    self.create_new_tab(filename, cursor_pos=cursor_pos, lazy=True)
             autosave_files = [f for f in os.listdir(self.autosave_dir) if f.endswith('.txt')]
             for filename in autosave_files:
                 full_path = os.path.join(self.autosave_dir, filename)
                 if full_path not in self.open_tabs:
-                    try:
-                        with open(full_path, 'r', encoding="utf-8") as f:
-                            content = f.read()
-                        cursor_pos = self.cursor_positions.get(full_path, "1.0")
-                        tab_id = self.create_new_tab(full_path, content, cursor_pos)
-                        tab_ids[full_path] = tab_id
-                    except Exception as e:
-                        print(f"Error loading tab {filename}: {e}")
+                    cursor_pos = self.cursor_positions.get(full_path, "1.0")
+                    self.create_new_tab(full_path, cursor_pos=cursor_pos, lazy=True)
 
             # Update untitled_counter based on autosave files
             highest_num = 0
@@ -563,22 +1124,7 @@ class TextEditor:
                         pass
             self.untitled_counter = max(self.untitled_counter or 1, highest_num + 1)
 
-            # Select the saved tab index, if valid
-            if self.selected_tab_index is not None and self.tabs:
-                # Ensure the index is valid (not exceeding the number of tabs, excluding the fixed "+" tab)
-                max_index = self.notebook.index("end") - 2  # Subtract 1 for 0-based indexing and 1 for fixed tab
-                if 0 <= self.selected_tab_index <= max_index:
-                    tab_id = None
-                    for tid, tab_info in self.tabs.items():
-                        if self.notebook.index(tab_info["frame"]) == self.selected_tab_index:
-                            tab_id = tid
-                            break
-                    if tab_id is not None:
-                        self.notebook.select(self.selected_tab_index)
-                        self.current_file = tab_id
-                        self.tabs[tab_id]["file_path_label"].config(text=self.tabs[tab_id]["filename"])
-                        self.count_display_lines()
-                        self.get_current_text_widget().toggle_spec_chars(self.show_special)
+            # The saved tab is selected and built by select_tab_and_set_cursor
         except Exception as e:
             print(f"Error loading tabs: {e}")
 
@@ -588,7 +1134,7 @@ class TextEditor:
             self.default_font_size = new_size
             self.font_size_display.config(text=str(new_size))
             self.update_font_sizes()
-            self.count_display_lines()
+            self.request_line_count()
             self.save_settings()
         except ValueError:
             pass
@@ -596,19 +1142,17 @@ class TextEditor:
     def update_font_sizes(self):
         for tab_id, tab_info in self.tabs.items():
             text_widget = tab_info["text_widget"]
-            text_widget.configure(font=("Times New Roman", self.default_font_size, "bold"))
+            if text_widget is not None:
+                text_widget.configure(font=("Times New Roman", self.default_font_size, "bold"))
+            elif tab_info["viewer"] is not None:
+                tab_info["viewer"].set_font(("Times New Roman", self.default_font_size, "bold"))
 
     def on_notebook_double_click(self, event):
         # Get the tab that was clicked
         try:
             clicked_tab_index = self.notebook.index(f"@{event.x},{event.y}")
 
-            # Find the tab ID from the index
-            tab_id = None
-            for tid, tab_info in self.tabs.items():
-                if self.notebook.index(tab_info["frame"]) == clicked_tab_index:
-                    tab_id = tid
-                    break
+            tab_id = self.tabs.id_at(clicked_tab_index)
             if tab_id is not None:
                 # Close the tab
                 self.close_tab(tab_id)
@@ -619,36 +1163,50 @@ class TextEditor:
         # Check if there are unsaved changes
         tab_info = self.tabs[tab_id]
         filename = tab_info["filename"]
+        if tab_info["loader"] is not None:
+            self.cancel_loading(tab_id)
+            return True
+        if tab_info["saving"] is not None:
+            tab_info["saving"].complete()
         if self.autosave_dir in filename:
+            from tkinter import messagebox
             response = messagebox.askyesnocancel("Захаваць?", "Захаваць файл перад закрыццём?")
             if response is None:
                 return False
             elif response:
-                if not self.save_file_as():
+                if not self.save_file_as(wait=True):
                     return False
             else:
+                self.writer.wait()  # A pending autosave must not recreate the file
                 try:
                     os.remove(filename)
                 except FileNotFoundError:
                     print(f'File {filename} not found.')
+        if tab_info["journal"] is not None:
+            tab_info["journal"].discard()
+        self.remove_tab(tab_id)
+        return True
 
-        # Remove the tab
-        self.notebook.forget(self.tabs[tab_id]["frame"])
-
-        # Remove from tabs dictionary
-        del self.tabs[tab_id]
+    def remove_tab(self, tab_id):
+        if tab_id not in self.tabs:
+            return
+        tab_info = self.tabs[tab_id]
+        position = self.tabs.position_of(tab_id)
+        self.notebook.forget(tab_info["frame"])
+        self.tabs.remove(tab_id)
+        tab_info["frame"].destroy()
+        self.vocabulary.forget(tab_id)
+        self.fixed_tab_index = len(self.tabs)
 
         # If there are no more tabs, create a new one
         if not self.tabs:
             self.create_new_tab()
         else:
-            tid = len(self.tabs) - 1
-            self.notebook.select(tid)
-            self.current_file = tid
-            self.selected_tab_index = self.notebook.index("current")
+            # Select the tab that took its place, or the new last one
+            self.selected_tab_index = min(position, len(self.tabs) - 1)
+            self.current_file = self.tabs.id_at(self.selected_tab_index)
+            self.notebook.select(self.tabs[self.current_file]["frame"])
             self.save_settings()
-        self.fixed_tab_index = self.notebook.index("end") - 1
-        return True
 
 def _onKeyRelease(event):
     ctrl = (event.state & 0x4) != 0
@@ -661,14 +1219,43 @@ def _onKeyRelease(event):
     if event.keycode == 67 and ctrl and event.keysym.lower() != "c":
         event.widget.event_generate("<<Copy>>")
 
+    if event.keycode == 70 and ctrl and event.keysym.lower() != "f":
+        event.widget.event_generate("<<Find>>")
+
+    if event.keycode == 72 and ctrl and event.keysym.lower() != "h":
+        event.widget.event_generate("<<Replace>>")
+
 
 def main():
-    root = tk.Tk()
-    TextEditor(root)
-    root.state('zoomed')
-    root.bind_all("<Key>", _onKeyRelease, "+")
-    root.mainloop()
+    # With --profile-startup the timings of the startup phases are written to REPORT_FILE
+    profile = StartupProfile(PROFILE_FLAG in sys.argv[1:])
+    paths = [os.path.abspath(path) for path in sys.argv[1:] if path != PROFILE_FLAG]
+    # A running editor opens the files itself, this process exits before creating a window
+    with profile.phase("forward to running instance"):
+        if forward_to_running_instance(SETTINGS_DIR, paths):
+            return
+    os.makedirs(SETTINGS_DIR, exist_ok=True)
+    with profile.phase("instance server"):
+        server = InstanceServer(SETTINGS_DIR)
+    try:
+        with profile.phase("Tk"):
+            root = tk.Tk()
+        with profile.phase("editor"):
+            editor = TextEditor(root, profile)
+        root.state('zoomed')
+        root.bind_all("<Key>", _onKeyRelease, "+")
+        if paths:
+            editor.open_paths(paths)
+        server.attach(root, editor.open_paths)
+        profile.mark("main loop")
+        root.mainloop()
+    finally:
+        server.close()
 
 
 if __name__ == "__main__":
+    if getattr(sys, "frozen", False):
+        # Find in files starts worker processes from the frozen executable too
+        import multiprocessing
+        multiprocessing.freeze_support()
     main()
@@ -0,0 +1,190 @@
+import mmap
+import os
+import threading
+import tkinter as tk
+from tkinter import font as tkfont
+from tkinter import ttk
+
+BLOCK_SIZE = 1 << 20  # Bytes per entry of the sparse line index
+MAX_ROW_BYTES = 4096  # Longer lines are shown as several rows of at most this many bytes
+INDEX_POLL_MS = 200
+
+
+def char_boundary(mm, offset):
+    """Move offset back to the start of a UTF-8 character."""
+    for _ in range(3):
+        if offset <= 0 or mm[offset] & 0xC0 != 0x80:
+            break
+        offset -= 1
+    return offset
+
+
+class MmapViewer(ttk.Frame):
+    """Read-only view of a file too big to load into a Text widget.
+
+    The file is memory-mapped and only the rows in the viewport are decoded
+    and put into the Text widget, so opening is instant and memory does not
+    grow with the file. The scroll position is a byte offset. A worker thread
+    counts the newlines of every BLOCK_SIZE block to build a sparse line index
+    that gives line numbers.
+    """
+
+    def __init__(self, master, path, font, **kwargs):
+        super().__init__(master)
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.path.getsize(path)
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.top = 0  # Byte offset of the first visible row
+        self.bottom = 0  # Byte offset just after the last visible row
+        self.block_lines = []  # Newlines before the start of every indexed block
+        self.total_lines = None  # Known once the index is complete
+        self.closed = False
+
+        self.text = tk.Text(self, wrap="none", font=font, **kwargs)
+        self.scrollbar = ttk.Scrollbar(self, command=self.on_scrollbar)
+        self.position_label = ttk.Label(self, text="", font=("Arial", 12))
+        self.position_label.pack(side="bottom", fill="x")
+        self.scrollbar.pack(side="right", fill="y")
+        self.text.pack(side="left", fill="both", expand=True)
+        self.text.config(state="disabled")
+        self.text_font = tkfont.Font(root=self.text, font=self.text.cget("font"))
+
+        self.text.bind("<Configure>", lambda event: self.render())
+        self.text.bind("<Button-1>", lambda event: self.text.focus_set())
+        self.text.bind("<MouseWheel>", lambda event: self.scroll_rows(-3 if event.delta > 0 else 3))
+        self.text.bind("<Button-4>", lambda event: self.scroll_rows(-3))
+        self.text.bind("<Button-5>", lambda event: self.scroll_rows(3))
+        self.text.bind("<Up>", lambda event: self.scroll_rows(-1))
+        self.text.bind("<Down>", lambda event: self.scroll_rows(1))
+        self.text.bind("<Prior>", lambda event: self.scroll_rows(-self.visible_rows()))
+        self.text.bind("<Next>", lambda event: self.scroll_rows(self.visible_rows()))
+        self.text.bind("<Control-Home>", lambda event: self.move_to(0.0))
+        self.text.bind("<Control-End>", lambda event: self.move_to(1.0))
+
+        self.index_thread = threading.Thread(target=self._build_index, name="natatnik-index", daemon=True)
+        self.index_thread.start()
+        self.after(INDEX_POLL_MS, self.poll_index)
+
+    def destroy(self):
+        # The index thread stops at the next block; it must be done before the map is closed
+        self.closed = True
+        self.index_thread.join()
+        self.mm.close()
+        self.file.close()
+        super().destroy()
+
+    def focus_set(self):
+        self.text.focus_set()
+
+    def set_font(self, font):
+        self.text.configure(font=font)
+        self.text_font = tkfont.Font(root=self.text, font=self.text.cget("font"))
+        self.render()
+
+    def _build_index(self):
+        lines = 0
+        for start in range(0, self.size, BLOCK_SIZE):
+            if self.closed:
+                return
+            self.block_lines.append(lines)
+            lines += self.mm[start:start + BLOCK_SIZE].count(b"\n")
+        self.total_lines = lines + 1
+
+    def poll_index(self):
+        if self.closed:
+            return
+        self.update_position()
+        if self.total_lines is None:
+            self.after(INDEX_POLL_MS, self.poll_index)
+
+    def line_number(self, offset):
+        """Return the 1-based line at a byte offset, or None if that part is not indexed yet."""
+        block = offset // BLOCK_SIZE
+        if block >= len(self.block_lines):
+            return None
+        return self.block_lines[block] + self.mm[block * BLOCK_SIZE:offset].count(b"\n") + 1
+
+    def update_position(self):
+        line = self.line_number(self.top)
+        text = f"Радок {line}" if line is not None else "Радок …"
+        if self.total_lines is not None:
+            text += f" з {self.total_lines}"
+        else:
+            text += f" (індэксаванне {len(self.block_lines) * BLOCK_SIZE * 100 // max(self.size, 1)}%)"
+        self.position_label.config(text=text)
+
+    def visible_rows(self):
+        return max(1, self.text.winfo_height() // self.text_font.metrics("linespace"))
+
+    def row_end(self, offset):
+        """Return (end of the row starting at offset, start of the next row)."""
+        limit = min(offset + MAX_ROW_BYTES, self.size)
+        newline = self.mm.find(b"\n", offset, limit)
+        if newline != -1:
+            return newline, newline + 1
+        if limit == self.size:
+            return limit, limit
+        limit = char_boundary(self.mm, limit)
+        return limit, limit
+
+    def row_start(self, offset):
+        """Return the start of the row containing offset."""
+        if offset <= 0:
+            return 0
+        low = max(0, offset - MAX_ROW_BYTES)
+        newline = self.mm.rfind(b"\n", low, offset)
+        if newline != -1:
+            return newline + 1
+        return char_boundary(self.mm, low) if low else 0
+
+    def render(self):
+        rows = []
+        offset = self.top
+        for _ in range(self.visible_rows()):
+            if offset >= self.size:
+                break
+            end, next_offset = self.row_end(offset)
+            rows.append(self.mm[offset:end].decode("utf-8", errors="replace").rstrip("\r"))
+            offset = next_offset
+        self.bottom = offset
+        self.text.config(state="normal")
+        self.text.delete("1.0", "end")
+        self.text.insert("1.0", "\n".join(rows))
+        self.text.config(state="disabled")
+        self.scrollbar.set(self.top / self.size, self.bottom / self.size)
+        self.update_position()
+
+    def scroll_rows(self, count):
+        offset = self.top
+        if count > 0:
+            for _ in range(count):
+                if self.bottom >= self.size and offset == self.top:
+                    break  # The end of the file is already visible
+                next_offset = self.row_end(offset)[1]
+                if next_offset >= self.size:
+                    break
+                offset = next_offset
+        else:
+            for _ in range(-count):
+                if offset == 0:
+                    break
+                offset = self.row_start(offset - 1)
+        self.top = offset
+        self.render()
+        return "break"
+
+    def move_to(self, fraction):
+        self.top = self.row_start(int(min(max(fraction, 0.0), 1.0) * self.size))
+        self.render()
+        if fraction >= 1.0:
+            self.scroll_rows(-self.visible_rows() + 1)
+        return "break"
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.move_to(float(amount))
+        elif unit == "pages":
+            self.scroll_rows(int(amount) * self.visible_rows())
+        else:
+            self.scroll_rows(int(amount))
@@ -0,0 +1,156 @@
+import functools
+import json
+import os
+import time
+import tkinter as tk
+
+BUCKETS = 25  # Bucket n holds durations below 2 ** n microseconds, the last one everything from 2 ** 23 µs (8 s) up
+DUMP_INTERVAL = 60000  # ms between the lines appended to the perf log
+MAX_LOG_BYTES = 1024 * 1024  # The log is rotated to .1 when a line would make it larger
+OVERLAY_REFRESH = 500  # ms
+BARS = " ▁▂▃▄▅▆▇█"
+
+HISTOGRAMS = {}  # Name -> Histogram, filled by timed()
+
+
+class Histogram:
+    """Fixed-size latency histogram with power-of-two microsecond buckets.
+
+    Recording is one subtraction, one bit_length() and one list increment,
+    so it can stay on in the handlers run for every keystroke. Counts since
+    the start are shown by the overlay; the perf log gets what was recorded
+    since its previous line.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = [0] * BUCKETS
+        self.total = 0.0  # Seconds
+        self.max = 0.0
+        self.logged_counts = [0] * BUCKETS  # Counts and total at the last perf log line
+        self.logged_total = 0.0
+        self.interval_max = 0.0
+
+    def record(self, seconds):
+        self.counts[min(int(seconds * 1000000).bit_length(), BUCKETS - 1)] += 1
+        self.total += seconds
+        if seconds > self.interval_max:
+            self.interval_max = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def count(self):
+        return sum(self.counts)
+
+    def percentile(self, fraction, counts=None):
+        """Return the upper bound in ms of the bucket holding the given fraction of the samples."""
+        counts = counts or self.counts
+        target = fraction * sum(counts)
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if count and seen >= target:
+                return (1 << bucket) / 1000
+        return 0.0
+
+    def take_interval(self):
+        """Return what was recorded since the last call as a dict, or None if nothing was."""
+        counts = [now - before for now, before in zip(self.counts, self.logged_counts)]
+        if not any(counts):
+            return None
+        interval = {"count": sum(counts), "total_ms": round((self.total - self.logged_total) * 1000, 3),
+                    "max_ms": round(self.interval_max * 1000, 3), "p50_ms": self.percentile(0.5, counts),
+                    "p99_ms": self.percentile(0.99, counts), "buckets": counts}
+        self.logged_counts = list(self.counts)
+        self.logged_total = self.total
+        self.interval_max = 0.0
+        return interval
+
+
+def timed(name):
+    """Decorate a function to record its duration in the histogram called name."""
+    histogram = HISTOGRAMS.setdefault(name, Histogram(name))
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.record(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+class PerfLog:
+    """Appends the histograms recorded in every DUMP_INTERVAL to a JSON lines file.
+
+    A line is only written for an interval in which something was recorded;
+    lines are written on the background writer and the file is rotated to
+    path + ".1" when it grows past MAX_LOG_BYTES.
+    """
+
+    def __init__(self, root, path, writer):
+        self.root = root
+        self.path = path
+        self.writer = writer
+        self.root.after(DUMP_INTERVAL, self.run)
+
+    def run(self):
+        self.dump()
+        self.root.after(DUMP_INTERVAL, self.run)
+
+    def dump(self):
+        histograms = {}
+        for name, histogram in HISTOGRAMS.items():
+            interval = histogram.take_interval()
+            if interval is not None:
+                histograms[name] = interval
+        if histograms:
+            line = json.dumps({"time": round(time.time(), 3), "pid": os.getpid(), "histograms": histograms})
+            self.writer.submit(self._append, line + "\n")
+
+    def _append(self, line):
+        try:
+            if os.path.getsize(self.path) + len(line) > MAX_LOG_BYTES:
+                os.replace(self.path, self.path + ".1")
+        except OSError:
+            pass  # No log yet
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class PerfOverlay:
+    """Live table of the histograms drawn over the top right corner of the window."""
+
+    def __init__(self, root):
+        self.root = root
+        self.label = None
+        self.timer = None
+
+    def toggle(self):
+        if self.timer is not None:
+            self.root.after_cancel(self.timer)
+            self.timer = None
+            self.label.place_forget()
+            return
+        if self.label is None:
+            self.label = tk.Label(self.root, bg="#1a1a1a", fg="#e0e0e0", font=("Consolas", 11), justify="left",
+                                  anchor="nw", padx=8, pady=6)
+        self.label.place(relx=1.0, x=-10, y=10, anchor="ne")
+        self.label.lift()
+        self.refresh()
+
+    def refresh(self):
+        lines = [f"{'':<20}{'count':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}  <1µs … ≥8s"]
+        for name, histogram in sorted(HISTOGRAMS.items()):
+            count = histogram.count()
+            if not count:
+                continue
+            peak = max(histogram.counts)
+            bars = "".join(BARS[(c * (len(BARS) - 1) + peak - 1) // peak] for c in histogram.counts)
+            lines.append(f"{name:<20}{count:>8}{histogram.percentile(0.5):>9.2f}{histogram.percentile(0.99):>9.2f}"
+                         f"{histogram.max * 1000:>9.2f}  {bars}")
+        self.label.config(text="\n".join(lines))
+        self.timer = self.root.after(OVERLAY_REFRESH, self.refresh)
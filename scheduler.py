@@ -0,0 +1,75 @@
+import time
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class IdleScheduler:
+    """Coalesces repeated requests for the same job into a single run on the Tk event loop."""
+
+    def __init__(self, root):
+        self.root = root
+        self.jobs = {}  # key -> [due time, priority, first request time, callback]
+        self.timer = None
+        self.timer_due = None
+
+    def schedule(self, key, callback, delay=0, max_delay=None, priority=PRIORITY_NORMAL):
+        """Run callback once after delay ms without new requests for key.
+
+        Every request for the same key pushes the run back by delay, but never
+        past max_delay ms after the first pending request, so a held key still
+        gets periodic updates.
+        """
+        now = time.monotonic()
+        job = self.jobs.get(key)
+        first_request = job[2] if job else now
+        due = now + delay / 1000
+        if max_delay is not None:
+            due = min(due, first_request + max_delay / 1000)
+        self.jobs[key] = [due, priority, first_request, callback]
+        self._arm()
+
+    def cancel(self, key):
+        self.jobs.pop(key, None)
+
+    def flush(self, key=None):
+        """Run pending jobs (or only the one for key) immediately."""
+        keys = [key] if key is not None else list(self.jobs)
+        for job_key in keys:
+            job = self.jobs.pop(job_key, None)
+            if job:
+                self._call(job_key, job[3])
+
+    def _arm(self):
+        if not self.jobs:
+            return
+        due = min(job[0] for job in self.jobs.values())
+        if self.timer is not None:
+            if self.timer_due <= due:
+                return
+            self.root.after_cancel(self.timer)
+        delay = int((due - time.monotonic()) * 1000)
+        if delay <= 0:
+            self.timer = self.root.after_idle(self._run)
+        else:
+            self.timer = self.root.after(delay, self._run)
+        self.timer_due = due
+
+    def _run(self):
+        self.timer = None
+        now = time.monotonic()
+        due_jobs = sorted(((key, job) for key, job in self.jobs.items() if job[0] <= now),
+                          key=lambda item: item[1][1])
+        for key, _ in due_jobs:
+            del self.jobs[key]
+        for key, job in due_jobs:
+            self._call(key, job[3])
+        self._arm()
+
+    @staticmethod
+    def _call(key, callback):
+        try:
+            callback()
+        except Exception as e:
+            print(f"Error running scheduled job {key}: {e}")
@@ -0,0 +1,339 @@
+import queue
+import re
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk
+
+from scheduler import PRIORITY_HIGH
+from text_widget import split_index
+
+QUERY_DELAY = 150  # Wait after the last keystroke in the query before searching
+REFRESH_DELAY = 300  # Wait after the last edit before highlighting and counting again
+COUNT_POLL_MS = 50
+COUNT_SLICE = 64 * 1024  # Characters scanned per regex call while counting, the Tk thread gets the GIL in between
+COUNT_OVERLAP = 4096  # Matches running this far past the end of a slice are still found whole
+BACKWARD_WINDOW = 4096  # First window searched before the cursor, doubled until a match is found
+
+
+def compile_query(query, regex, match_case):
+    flags = re.MULTILINE if match_case else re.MULTILINE | re.IGNORECASE
+    return re.compile(query if regex else re.escape(query), flags)
+
+
+def offset_to_index(text, offset, first_line=1):
+    """Return the "line.col" index of a character offset in text that starts at first_line."""
+    line_start = text.rfind("\n", 0, offset) + 1
+    return f"{text.count(chr(10), 0, offset) + first_line}.{offset - line_start}"
+
+
+class FindBar(ttk.Frame):
+    """Find/replace bar working on one TextWidget at a time.
+
+    Only the matches in the viewport are tagged, again whenever the view
+    scrolls, so a query costs the same in a short note and in a multi-MB
+    manuscript. The total is counted on a worker thread over a snapshot of
+    the document mirror; a newer query or edit makes a running count stop.
+    Replace-all is one bulk replace of the span from the first to the last
+    match, a single undo step.
+    """
+
+    def __init__(self, master, scheduler, on_replaced=None):
+        super().__init__(master)
+        self.scheduler = scheduler
+        self.on_replaced = on_replaced  # Called after the text was changed by a replace
+        self.text_widget = None
+        self.pattern = None
+        self.generation = 0  # Incremented by every new search, stops counts of older ones
+        self.counts = queue.Queue()
+        self.counting = 0  # Count threads that have not reported yet
+        self.text = None  # Whole text of the widget, built once per edit generation
+        self.text_generation = None
+
+        self.query_var = tk.StringVar()
+        self.replacement_var = tk.StringVar()
+        self.regex_var = tk.BooleanVar(value=False)
+        self.case_var = tk.BooleanVar(value=False)
+
+        find_row = ttk.Frame(self)
+        find_row.pack(side="top", fill="x")
+        ttk.Label(find_row, text="Знайсці:", font=("Arial", 12)).pack(side="left", padx=5)
+        self.query_entry = ttk.Entry(find_row, textvariable=self.query_var, width=40, font=("Arial", 12))
+        self.query_entry.pack(side="left", padx=5)
+        ttk.Checkbutton(find_row, text="Рэгулярны выраз", variable=self.regex_var,
+                        command=self.request_search).pack(side="left", padx=5)
+        ttk.Checkbutton(find_row, text="Улічваць рэгістр", variable=self.case_var,
+                        command=self.request_search).pack(side="left", padx=5)
+        ttk.Button(find_row, text="Папярэдні", command=self.find_previous).pack(side="left", padx=3)
+        ttk.Button(find_row, text="Наступны", command=self.find_next).pack(side="left", padx=3)
+        self.count_label = ttk.Label(find_row, text="", font=("Arial", 12))
+        self.count_label.pack(side="left", padx=5)
+        ttk.Button(find_row, text="✕", width=3, command=self.hide).pack(side="right", padx=5)
+
+        self.replace_row = ttk.Frame(self)
+        ttk.Label(self.replace_row, text="Замяніць на:", font=("Arial", 12)).pack(side="left", padx=5)
+        self.replacement_entry = ttk.Entry(self.replace_row, textvariable=self.replacement_var, width=40,
+                                           font=("Arial", 12))
+        self.replacement_entry.pack(side="left", padx=5)
+        ttk.Button(self.replace_row, text="Замяніць", command=self.replace).pack(side="left", padx=3)
+        ttk.Button(self.replace_row, text="Замяніць усе", command=self.replace_all).pack(side="left", padx=3)
+
+        self.query_var.trace_add("write", lambda *args: self.request_search())
+        for entry in (self.query_entry, self.replacement_entry):
+            entry.bind("<Return>", lambda event: self.find_next() or "break")
+            entry.bind("<Shift-Return>", lambda event: self.find_previous() or "break")
+            entry.bind("<Escape>", lambda event: self.hide() or "break")
+
+    def show(self, text_widget, replace=False, **pack_options):
+        if not self.winfo_manager():
+            self.pack(side="bottom", fill="x", padx=5, **pack_options)
+        if replace:
+            self.replace_row.pack(side="top", fill="x", pady=(3, 0))
+        else:
+            self.replace_row.pack_forget()
+        self.attach(text_widget)
+        # Start from the selection when it is a short piece of one line
+        if text_widget is not None and text_widget.tag_ranges(tk.SEL):
+            selected = text_widget.get(tk.SEL_FIRST, tk.SEL_LAST)
+            if selected and "\n" not in selected and len(selected) < 200:
+                self.query_var.set(re.escape(selected) if self.regex_var.get() else selected)
+        self.query_entry.focus_set()
+        self.query_entry.select_range(0, "end")
+
+    def hide(self):
+        text_widget = self.text_widget
+        self.pack_forget()
+        self.attach(None)
+        if text_widget is not None:
+            text_widget.focus_set()
+
+    def attach(self, text_widget):
+        """Search in text_widget from now on (None when the current tab has no text widget)."""
+        if not self.winfo_manager():
+            text_widget = None  # A hidden bar leaves the widgets alone
+        if text_widget is self.text_widget:
+            self.request_search()
+            return
+        if self.text_widget is not None:
+            try:
+                self.text_widget.edit_listeners.remove(self.on_edit)
+                self.text_widget.scroll_listeners.remove(self.request_highlight)
+                self.clear_tags()
+            except (ValueError, tk.TclError):
+                pass  # The widget was destroyed with its tab
+        self.text_widget = text_widget
+        self.text = None
+        if text_widget is not None:
+            text_widget.edit_listeners.append(self.on_edit)
+            text_widget.scroll_listeners.append(self.request_highlight)
+            text_widget.tag_configure("search_match", background="#5c4f00")
+            text_widget.tag_configure("search_current", background="#a67c00")
+            text_widget.tag_lower("search_match", tk.SEL)
+            text_widget.tag_lower("search_current", tk.SEL)
+        self.request_search()
+
+    def clear_tags(self):
+        self.text_widget.tag_remove("search_match", "1.0", "end")
+        self.text_widget.tag_remove("search_current", "1.0", "end")
+
+    def on_edit(self, op, start, end, text):
+        self.text = None
+        self.scheduler.schedule("search", self.search, delay=REFRESH_DELAY)
+
+    def request_search(self):
+        self.scheduler.schedule("search", self.search, delay=QUERY_DELAY)
+
+    def request_highlight(self, first=None, last=None):
+        self.scheduler.schedule("search_highlight", self.highlight, delay=30, max_delay=150, priority=PRIORITY_HIGH)
+
+    def search(self):
+        """Compile the query, highlight the viewport and start counting every match."""
+        self.generation += 1
+        self.pattern = None
+        if self.text_widget is None or not self.winfo_manager():
+            self.count_label.config(text="")
+            return
+        query = self.query_var.get()
+        if query:
+            try:
+                self.pattern = compile_query(query, self.regex_var.get(), self.case_var.get())
+            except re.error as e:
+                self.count_label.config(text=f"Памылка ў выразе: {e}")
+        self.highlight()
+        if self.pattern is None:
+            if not query:
+                self.count_label.config(text="")
+            return
+        self.count_label.config(text="Падлік…")
+        snapshot = self.text_widget.document.snapshot()
+        threading.Thread(target=self._count, args=(self.generation, self.pattern, snapshot),
+                         name="natatnik-search", daemon=True).start()
+        self.counting += 1
+        if self.counting == 1:
+            self.after(COUNT_POLL_MS, self._poll_counts)
+
+    def _count(self, generation, pattern, snapshot):
+        # Worker thread: the snapshot slices never change, whatever is typed meanwhile. re holds the GIL
+        # for a whole call, so the text is scanned in bounded slices ending at a line start; a slice counts
+        # the matches starting in it, found in the slice plus COUNT_OVERLAP characters after it.
+        text = "".join(buffer[start:end] for buffer, start, end in snapshot)
+        count = 0
+        position = 0
+        while generation == self.generation:
+            slice_end = text.find("\n", position + COUNT_SLICE) + 1 or len(text)
+            next_position = slice_end
+            for match in pattern.finditer(text, position, min(len(text), slice_end + COUNT_OVERLAP)):
+                if match.start() >= slice_end and slice_end < len(text):
+                    break
+                count += 1
+                next_position = max(next_position, match.end())
+            if slice_end >= len(text):
+                break
+            position = next_position
+            time.sleep(0)  # Let the Tk thread run
+        self.counts.put((generation, count))  # Reported even when stopped, so polling ends
+
+    def _poll_counts(self):
+        while True:
+            try:
+                generation, count = self.counts.get_nowait()
+            except queue.Empty:
+                break
+            self.counting -= 1
+            if generation == self.generation:
+                self.count_label.config(text=f"Супадзенняў: {count}" if count else "Не знойдзена")
+        if self.counting > 0:
+            self.after(COUNT_POLL_MS, self._poll_counts)
+
+    def highlight(self):
+        """Tag the matches in the viewport only."""
+        if self.text_widget is None:
+            return
+        try:
+            self.text_widget.tag_remove("search_match", "1.0", "end")
+            if self.pattern is None:
+                self.text_widget.tag_remove("search_current", "1.0", "end")
+                return
+            first = split_index(self.text_widget.index("@0,0"))[0]
+            last = split_index(self.text_widget.index(f"@0,{self.text_widget.winfo_height()}"))[0]
+        except tk.TclError:
+            return  # The widget was destroyed with its tab
+        text = self.text_widget.document.get_lines(first, last)
+        ranges = []
+        for match in self.pattern.finditer(text):
+            if match.end() > match.start():
+                ranges.append(offset_to_index(text, match.start(), first))
+                ranges.append(offset_to_index(text, match.end(), first))
+        if ranges:
+            self.text_widget.tag_add("search_match", *ranges)
+
+    def current_text(self):
+        # One join per edit generation serves every next/previous/replace until the next edit
+        if self.text is None or self.text_generation != self.text_widget.edit_generation:
+            self.text = self.text_widget.document.text()
+            self.text_generation = self.text_widget.edit_generation
+        return self.text
+
+    def cursor_offset(self, index=tk.INSERT):
+        line, col = split_index(self.text_widget.index(index))
+        return self.text_widget.document.offset(line, col)
+
+    def ready(self):
+        self.scheduler.flush("search")  # A query typed just now has not been compiled yet
+        return self.text_widget is not None and self.pattern is not None
+
+    def find_next(self):
+        if not self.ready():
+            return
+        text = self.current_text()
+        offset = self.cursor_offset()
+        match = self.pattern.search(text, offset)
+        if match is not None and match.start() == match.end() == offset:
+            match = self.pattern.search(text, offset + 1)  # Step over an empty match at the cursor
+        if match is None:
+            match = self.pattern.search(text)  # Wrap around
+        self.select_match(text, match)
+
+    def find_previous(self):
+        if not self.ready():
+            return
+        text = self.current_text()
+        start = self.cursor_offset(tk.SEL_FIRST if self.text_widget.tag_ranges(tk.SEL) else tk.INSERT)
+        self.select_match(text, self.last_match_before(text, start) or self.last_match_before(text, len(text)))
+
+    def last_match_before(self, text, end):
+        # Search growing windows before end instead of every match from the start of the text
+        window = BACKWARD_WINDOW
+        while True:
+            low = max(0, end - window)
+            found = None
+            for match in self.pattern.finditer(text, low, end):
+                if match.start() < end:
+                    found = match
+            if found is not None or low == 0:
+                return found
+            window *= 2
+
+    def select_match(self, text, match):
+        self.text_widget.tag_remove("search_current", "1.0", "end")
+        self.text_widget.tag_remove(tk.SEL, "1.0", "end")
+        if match is None:
+            self.count_label.config(text="Не знойдзена")
+            return
+        start = offset_to_index(text, match.start())
+        end = offset_to_index(text, match.end())
+        self.text_widget.tag_add("search_current", start, end)
+        self.text_widget.tag_add(tk.SEL, start, end)
+        self.text_widget.mark_set(tk.INSERT, end)
+        self.text_widget.see(start)
+        self.text_widget.see(end)
+
+    def expand(self, match):
+        return match.expand(self.replacement_var.get()) if self.regex_var.get() else self.replacement_var.get()
+
+    def replace(self):
+        """Replace the selected match and go to the next one."""
+        if not self.ready():
+            return
+        if self.text_widget.tag_ranges(tk.SEL):
+            text = self.current_text()
+            start, end = self.cursor_offset(tk.SEL_FIRST), self.cursor_offset(tk.SEL_LAST)
+            match = self.pattern.match(text, start)
+            if match is not None and match.end() == end:
+                try:
+                    replacement = self.expand(match)
+                except (re.error, IndexError) as e:
+                    self.count_label.config(text=f"Памылка ў замене: {e}")
+                    return
+                self.text_widget.bulk_replace(tk.SEL_FIRST, tk.SEL_LAST, replacement)
+                self.text_widget.mark_set(tk.INSERT, offset_to_index(text, start) + f"+{len(replacement)}c")
+                if self.on_replaced:
+                    self.on_replaced()
+        self.find_next()
+
+    def replace_all(self):
+        if not self.ready():
+            return
+        text = self.current_text()
+        parts = []
+        first = last = None
+        try:
+            for match in self.pattern.finditer(text):
+                if first is None:
+                    first = match.start()
+                else:
+                    parts.append(text[last:match.start()])
+                parts.append(self.expand(match))
+                last = match.end()
+        except (re.error, IndexError) as e:
+            self.count_label.config(text=f"Памылка ў замене: {e}")
+            return
+        if first is None:
+            self.count_label.config(text="Не знойдзена")
+            return
+        # Only the span between the first and the last match is replaced, as one undo step
+        self.text_widget.bulk_replace(offset_to_index(text, first), offset_to_index(text, last), "".join(parts))
+        self.text_widget.mark_set(tk.INSERT, offset_to_index(text, first))
+        self.text_widget.see(tk.INSERT)
+        if self.on_replaced:
+            self.on_replaced()
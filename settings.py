@@ -0,0 +1,52 @@
+import json
+import os
+
+from autosave import atomic_write
+from perf import timed
+from scheduler import PRIORITY_LOW
+
+FLUSH_INTERVAL = 300  # ms, settings reach the disk at most this often
+
+
+class SettingsStore:
+    """Settings file that is written only when the settings changed, and at most every FLUSH_INTERVAL ms.
+
+    collect is called when flushing and returns the settings to save, so
+    callers only mark the store dirty. The file is replaced atomically on the
+    background writer thread.
+    """
+
+    def __init__(self, path, scheduler, writer, collect):
+        self.path = path
+        self.scheduler = scheduler
+        self.writer = writer
+        self.collect = collect
+        self.dirty = False
+        self.last_written = None
+
+    def load(self):
+        """Return the saved settings, or an empty dict if there are none."""
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding="utf-8") as f:
+            settings = json.load(f)
+        self.last_written = json.dumps(settings, indent=2)
+        return settings
+
+    def mark_dirty(self):
+        self.dirty = True
+        self.scheduler.schedule(("settings", self.path), self.flush,
+                                delay=FLUSH_INTERVAL, max_delay=FLUSH_INTERVAL, priority=PRIORITY_LOW)
+
+    @timed("save_settings")
+    def flush(self, force=False):
+        """Write the settings if they were marked dirty, or always when force is set."""
+        self.scheduler.cancel(("settings", self.path))
+        if not self.dirty and not force:
+            return
+        self.dirty = False
+        content = json.dumps(self.collect(), indent=2)
+        if content == self.last_written:
+            return
+        self.last_written = content
+        self.writer.submit(atomic_write, self.path, content)
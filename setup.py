@@ -4,8 +4,12 @@ from cx_Freeze import setup, Executable
 # Dependencies are automatically detected, but it might need fine-tuning.
 build_exe_options = {
     "build_exe": "build/natatnik",
-    "packages": ["os", "tkinter", "json", "textwrap"],
-    "excludes": [],
+    "packages": ["os", "tkinter", "json"],
+    "excludes": ["unittest", "pydoc_data", "test", "tkinter.test"],
+    # Modules are read from one zip instead of hundreds of files, which matters most at startup
+    "zip_include_packages": ["*"],
+    "zip_exclude_packages": [],
+    "optimize": 2,
     "include_files": [
         ("img", "img")
     ]
@@ -0,0 +1,154 @@
+import re
+from array import array
+
+from autosave import RequestWorker
+
+CACHE_PARAGRAPHS = 20000  # Checked paragraphs whose misspellings are kept, most recently used last
+
+# Words of letters, with apostrophes inside (сям’я, з'езд); hyphenated words are checked part by part
+WORD_RE = re.compile(r"[^\W\d_]+(?:['’ʼ][^\W\d_]+)*")
+APOSTROPHES = str.maketrans("’ʼ", "''")
+
+
+class Dawg:
+    """Set of words stored as a minimal acyclic automaton (DAWG).
+
+    Words sharing a prefix share the path from the start state and words
+    sharing a suffix share the states at the end, so an inflected word list
+    takes a fraction of the memory of a set or a trie. The automaton is
+    stored in flat arrays: the edges of state n are edge_chars and
+    edge_targets between starts[n] and starts[n + 1], sorted by character.
+    """
+
+    def __init__(self, starts, edge_chars, edge_targets, finals):
+        self.starts = starts
+        self.edge_chars = edge_chars
+        self.edge_targets = edge_targets
+        self.finals = finals
+
+    @classmethod
+    def build(cls, words):
+        """Build the automaton of words, which must be sorted and unique."""
+        root = {}  # A state is a dict of edges, with "" -> True for a final state
+        registry = {}  # Signature -> the state kept for every state with it
+        ids = {}  # id(state) -> number of a registered state
+        unchecked = []  # (parent, char, child) along the last word, not minimized yet
+
+        def signature(state):
+            return tuple((char, ids[id(child)] if char else True) for char, child in sorted(state.items()))
+
+        def minimize(down_to):
+            while len(unchecked) > down_to:
+                parent, char, child = unchecked.pop()
+                key = signature(child)
+                if key in registry:
+                    parent[char] = registry[key]
+                else:
+                    ids[id(child)] = len(registry) + 1
+                    registry[key] = child
+
+        previous = ""
+        for word in words:
+            common = 0
+            for a, b in zip(word, previous):
+                if a != b:
+                    break
+                common += 1
+            minimize(common)
+            state = unchecked[-1][2] if unchecked else root
+            for char in word[common:]:
+                child = {}
+                state[char] = child
+                unchecked.append((state, char, child))
+                state = child
+            state[""] = True
+            previous = word
+        minimize(0)
+
+        # Number the states breadth first from the start state and flatten their edges
+        numbers = {id(root): 0}
+        order = [root]
+        starts = array("l")
+        chars = []
+        targets = array("l")
+        finals = bytearray()
+        for state in order:
+            starts.append(len(targets))
+            finals.append(1 if "" in state else 0)
+            for char in sorted(state):
+                if not char:
+                    continue
+                child = state[char]
+                if id(child) not in numbers:
+                    numbers[id(child)] = len(order)
+                    order.append(child)
+                chars.append(char)
+                targets.append(numbers[id(child)])
+        starts.append(len(targets))
+        return cls(starts, "".join(chars), targets, bytes(finals))
+
+    def __contains__(self, word):
+        state = 0
+        starts, edge_chars = self.starts, self.edge_chars
+        for char in word:
+            edge = edge_chars.find(char, starts[state], starts[state + 1])
+            if edge < 0:
+                return False
+            state = self.edge_targets[edge]
+        return bool(self.finals[state])
+
+
+def load_dictionary(path):
+    """Read a word list with one word per line into a Dawg."""
+    with open(path, "r", encoding="utf-8") as f:
+        words = {line.strip().translate(APOSTROPHES) for line in f}
+    words.discard("")
+    return Dawg.build(sorted(words))
+
+
+class SpellChecker(RequestWorker):
+    """Checks the spelling of paragraphs on its own worker thread.
+
+    The word list is read into a Dawg by the worker on the first check, so
+    startup does not pay for it. Misspellings are cached by paragraph text:
+    an edited paragraph has a new text and is checked again, unchanged ones
+    scrolled back into view cost a lookup. The checker is shared by every
+    TextWidget.
+    """
+
+    def __init__(self, root, dictionary_path):
+        self.dictionary_path = dictionary_path
+        self.dawg = None
+        self.unavailable = False  # The word list could not be read, nothing is marked
+        self.cache = {}  # Paragraph text -> misspelled (start, end) spans, used by the worker only
+        super().__init__(root, "natatnik-spelling")
+
+    def check(self, paragraphs, callback):
+        """Check (line, text) paragraphs and call callback with the misspelled (line, start, end) on the Tk thread."""
+        self.request(lambda spans: callback(spans or []), self._check, paragraphs)
+
+    def _check(self, paragraphs):
+        if self.dawg is None and not self.unavailable:
+            try:
+                self.dawg = load_dictionary(self.dictionary_path)
+            except (OSError, ValueError) as e:  # ValueError: not UTF-8
+                print(f"Error loading dictionary: {e}")
+                self.unavailable = True
+        spans = []
+        if self.dawg is not None:
+            for line, text in paragraphs:
+                spans.extend((line, start, end) for start, end in self.misspellings(text))
+        return spans
+
+    def misspellings(self, text):
+        spans = self.cache.pop(text, None)
+        if spans is None:
+            spans = [match.span() for match in WORD_RE.finditer(text) if not self.is_known(match.group())]
+        self.cache[text] = spans
+        while len(self.cache) > CACHE_PARAGRAPHS:
+            del self.cache[next(iter(self.cache))]
+        return spans
+
+    def is_known(self, word):
+        word = word.translate(APOSTROPHES)
+        return word in self.dawg or word.lower() in self.dawg
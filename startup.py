@@ -0,0 +1,53 @@
+import time
+from contextlib import contextmanager
+
+REPORT_FILE = "startup.txt"  # In the settings directory
+PROFILE_FLAG = "--profile-startup"
+
+
+class StartupProfile:
+    """Wall-clock timings of the startup phases, to see what delays the first window.
+
+    Phases are timed with phase() and marks record single moments, both
+    relative to when the profile was created at the start of main(). A
+    disabled profile only runs the phases, so the timing code can stay in
+    place.
+    """
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.before = time.process_time()  # CPU time of the interpreter start and the imports
+        self.entries = []  # (name, start, duration) in seconds since started, duration None for a mark
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.entries.append((name, start - self.started, time.perf_counter() - start))
+
+    def mark(self, name):
+        if self.enabled:
+            self.entries.append((name, time.perf_counter() - self.started, None))
+
+    def report(self):
+        lines = [f"CPU time before main(): {self.before * 1000:.1f} ms", "",
+                 f"{'start ms':>10} {'ms':>9}  phase"]
+        for name, start, duration in sorted(self.entries, key=lambda entry: entry[1]):
+            duration = "" if duration is None else f"{duration * 1000:.1f}"
+            lines.append(f"{start * 1000:10.1f} {duration:>9}  {name}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        if not self.enabled:
+            return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.report())
+        except OSError as e:
+            print(f"Error writing startup report: {e}")
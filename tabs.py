@@ -0,0 +1,73 @@
+from itertools import count
+
+
+class TabRegistry:
+    """Open tabs by stable id, with their frames and notebook positions kept in sync.
+
+    Ids are never reused, so a closed tab cannot be mistaken for a newer one.
+    The notebook order is mirrored here, so finding the tab at a position or
+    the position of a tab is a lookup instead of a notebook.index call per
+    tab. Iterating yields the ids in notebook order.
+    """
+
+    def __init__(self):
+        self.ids = count()
+        self.tabs = {}  # id -> tab_info
+        self.order = []  # ids in notebook order
+        self.positions = {}  # id -> position in the notebook
+        self.frames = {}  # Tk path of the tab frame -> id
+
+    def add(self, tab_info, position=None):
+        """Register a tab inserted into the notebook at position (at the end by default), return its id."""
+        tab_id = next(self.ids)
+        if position is None:
+            position = len(self.order)
+        self.tabs[tab_id] = tab_info
+        self.frames[str(tab_info["frame"])] = tab_id
+        self.order.insert(position, tab_id)
+        self._reindex(position)
+        return tab_id
+
+    def remove(self, tab_id):
+        """Unregister a tab and return its tab_info."""
+        tab_info = self.tabs.pop(tab_id)
+        del self.frames[str(tab_info["frame"])]
+        position = self.positions.pop(tab_id)
+        del self.order[position]
+        self._reindex(position)
+        return tab_info
+
+    def _reindex(self, first):
+        for position in range(first, len(self.order)):
+            self.positions[self.order[position]] = position
+
+    def id_at(self, position):
+        """Return the id of the tab at a notebook position, or None (e.g. for the "+" tab)."""
+        if 0 <= position < len(self.order):
+            return self.order[position]
+        return None
+
+    def position_of(self, tab_id):
+        return self.positions[tab_id]
+
+    def id_of_frame(self, frame):
+        """Return the id of the tab whose frame (widget or Tk path) is given, or None."""
+        return self.frames.get(str(frame))
+
+    def __getitem__(self, tab_id):
+        return self.tabs[tab_id]
+
+    def __contains__(self, tab_id):
+        return tab_id in self.tabs
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def items(self):
+        return [(tab_id, self.tabs[tab_id]) for tab_id in self.order]
+
+    def values(self):
+        return [self.tabs[tab_id] for tab_id in self.order]
@@ -0,0 +1,70 @@
+import os
+import random
+
+import history
+from history import DAY, HISTORY_INTERVAL, KEYFRAME_EVERY, MAX_VERSIONS, HistoryStore, versions_to_keep
+
+
+def edit(rng, text):
+    # A small edit somewhere in the text that keeps its length, so only the history can grow
+    position = rng.randrange(len(text) - 6)
+    return text[:position] + rng.choice(["слова ", "радок\n", "вечар "]) + text[position + 6:]
+
+
+def make_store(tmp_path):
+    # The Tk root is only needed to hand query results back, the jobs are called directly here
+    return HistoryStore(str(tmp_path / "history.sqlite3"), None)
+
+
+def test_recent_versions_are_all_kept():
+    now = 100 * DAY
+    versions = [(i, now - i * 60) for i in range(200, 0, -1)]
+    assert versions_to_keep(versions, now) == {i for i, _ in versions}
+
+
+def test_old_versions_are_thinned_per_hour_day_and_week():
+    now = 400 * DAY
+    versions = [(i, now - i * HISTORY_INTERVAL) for i in range(100 * DAY // HISTORY_INTERVAL, -1, -1)]
+    keep = versions_to_keep(versions, now)
+    assert 0 in keep
+    kept = [created for i, created in versions if i in keep]
+    assert len([c for c in kept if now - c < DAY]) == DAY // HISTORY_INTERVAL
+    assert len([c for c in kept if DAY <= now - c < 7 * DAY]) <= 6 * 24 + 1
+    assert len([c for c in kept if 7 * DAY <= now - c < 30 * DAY]) <= 23 + 1
+    assert len([c for c in kept if now - c >= 30 * DAY]) <= 70 // 7 + 2
+
+
+def test_version_count_is_capped():
+    versions = [(i, 0) for i in range(MAX_VERSIONS * 3)]
+    keep = versions_to_keep(versions, 0)
+    assert keep == set(range(MAX_VERSIONS * 2, MAX_VERSIONS * 3))
+
+
+def test_database_size_is_bounded(tmp_path, monkeypatch):
+    rng = random.Random(0)
+    interval = 6 * HISTORY_INTERVAL  # Half an hour between versions keeps the test quick
+    clock = [1000 * DAY]
+    monkeypatch.setattr(history.time, "time", lambda: clock[0])
+    store = make_store(tmp_path)
+    path = str(tmp_path / "document.txt")
+    text = "Пачатак дакумента.\n" * 200
+    recorded = {}
+    sizes = {}  # Day -> size of the database file
+    for step in range(60 * DAY // interval):
+        text = edit(rng, text)
+        store.add_version(path, text)
+        recorded[clock[0]] = text
+        clock[0] += interval
+        if step % (DAY // interval) == 0:
+            sizes[step * interval // DAY] = os.path.getsize(store.db_path)
+
+    versions = store.list_versions(path)
+    # A day of dense versions, hourly ones for the week and daily ones for the month, then weekly ones
+    assert len(versions) <= DAY // interval + 6 * 24 + 23 + 6 + KEYFRAME_EVERY
+    # The database stops growing once the daily versions of the month are all there
+    assert sizes[59] <= sizes[35] * 1.1
+    # Thinning re-based the deltas, every kept version still restores to what was recorded
+    for version_id, created, size in versions:
+        content = store.get_version(path, version_id)
+        assert content == recorded[created]
+        assert len(content) == size
@@ -0,0 +1,101 @@
+import random
+
+from undo_history import DELETE, INSERT, coalesce_records
+
+
+def offset(text, pos):
+    line, col = map(int, pos.split("."))
+    start = 0
+    for _ in range(line - 1):
+        start = text.index("\n", start) + 1
+    return start + col
+
+
+def position(text, offset):
+    line = text.count("\n", 0, offset) + 1
+    return f"{line}.{offset - (text.rfind(chr(10), 0, offset) + 1)}"
+
+
+def apply(text, records):
+    for kind, pos, chunk in records:
+        start = offset(text, pos)
+        if kind == INSERT:
+            text = text[:start] + chunk + text[start:]
+        else:
+            assert text[start:start + len(chunk)] == chunk
+            text = text[:start] + text[start + len(chunk):]
+    return text
+
+
+def replay(text, replacements):
+    for pos, old, new in replacements:
+        start = offset(text, pos)
+        assert text[start:start + len(old)] == old
+        text = text[:start] + new + text[start + len(old):]
+    return text
+
+
+def check(text, records, count):
+    edited = apply(text, records)
+    undo = coalesce_records(records, undo=True)
+    redo = coalesce_records(records, undo=False)
+    assert replay(edited, undo) == text
+    assert replay(text, redo) == edited
+    assert len(undo) == len(redo) == count
+
+
+def test_replaced_selection():
+    check("one two three", [(DELETE, "1.4", "two"), (INSERT, "1.4", "2")], 1)
+
+
+def test_typing_and_backspacing_over_the_start():
+    # Typed "abc", backspaced it and one character before it, then typed "xy"
+    records = [(INSERT, "1.3", "abc"), (DELETE, "1.2", "cabc"), (INSERT, "1.2", "xy")]
+    check("abcdef", records, 1)
+    assert coalesce_records(records, undo=False) == [("1.2", "c", "xy")]
+
+
+def test_forward_delete_past_the_inserted_text():
+    check("hello world", [(INSERT, "1.5", ",\nnew"), (DELETE, "2.1", "ew wor")], 1)
+
+
+def test_separate_runs_stay_separate():
+    records = [(DELETE, "1.0", "a"), (INSERT, "1.0", "A"), (INSERT, "2.3", "!"), (DELETE, "4.0", "c")]
+    check("abc\ndef\nghi\ncc", records, 3)
+
+
+def test_multiline_span():
+    records = [(INSERT, "2.1", "x\ny\nz"), (INSERT, "4.1", "w"), (DELETE, "2.0", "dx"), (INSERT, "3.0", "q")]
+    check("abc\ndef\nghi", records, 1)
+
+
+def random_records(rng, text, count):
+    records = []
+    for _ in range(count):
+        start = rng.randrange(len(text) + 1)
+        if text and rng.random() < 0.4:
+            chunk = text[start:start + rng.randint(1, 4)]
+            if chunk:
+                records.append((DELETE, position(text, start), chunk))
+                text = text[:start] + text[start + len(chunk):]
+                continue
+        chunk = rng.choice(["a", "bc", "\n", "d\ne", " "])
+        records.append((INSERT, position(text, start), chunk))
+        text = text[:start] + chunk + text[start:]
+        if rng.random() < 0.7:
+            # Keep editing around the same place, like typing does
+            start += len(chunk)
+    return records
+
+
+def test_random_groups_round_trip():
+    rng = random.Random(1)
+    for _ in range(2000):
+        text = "".join(rng.choice("ab\n ") for _ in range(rng.randint(0, 20)))
+        records = random_records(rng, text, rng.randint(1, 8))
+        edited = apply(text, records)
+        undo = coalesce_records(records, undo=True)
+        redo = coalesce_records(records, undo=False)
+        assert replay(edited, undo) == text
+        assert replay(text, redo) == edited
+        assert len(undo) <= len(records) and len(redo) <= len(records)
@@ -0,0 +1,168 @@
+import math
+import re
+
+from autosave import RequestWorker
+from text_widget import split_index
+
+WORDS_PER_MINUTE = 180  # Silent reading speed used for the reading time
+CACHE_PARAGRAPHS = 50000
+WORD_RE = re.compile(r"\w+(?:['’ʼ-]\w+)*")
+SENTENCE_END_RE = re.compile(r"[.!?…]+[»”\"')\]]*(?=\s|$)")
+
+
+def paragraph_stats(text):
+    """Return (words, characters, sentences, paragraphs) of one logical line."""
+    words = len(WORD_RE.findall(text))
+    if not words:
+        return 0, len(text), 0, 0
+    # A paragraph without end punctuation, like a heading, is still one sentence
+    return words, len(text), max(1, len(SENTENCE_END_RE.findall(text))), 1
+
+
+class StatisticsWorker(RequestWorker):
+    """Worker thread computing paragraph statistics, shared by every tab.
+
+    Results are cached by paragraph text, so counting a tab again after it
+    was hibernated or reloaded only computes the paragraphs that changed.
+    """
+
+    def __init__(self, root):
+        self.cache = {}  # Paragraph text -> stats, used by the worker only
+        super().__init__(root, "natatnik-statistics")
+
+    def stats_of(self, text):
+        stats = self.cache.get(text)
+        if stats is None:
+            stats = self.cache[text] = paragraph_stats(text)
+            if len(self.cache) > CACHE_PARAGRAPHS:
+                del self.cache[next(iter(self.cache))]
+        return stats
+
+    def count_snapshot(self, snapshot):
+        """Worker job: return the stats of every line of a document snapshot."""
+        text = "".join(buffer[start:end] for buffer, start, end in snapshot)
+        return [self.stats_of(line) for line in text.split("\n")]
+
+    def count_lines(self, lines):
+        """Worker job: return (line, stats) of (line, text) pairs."""
+        return [(line, self.stats_of(text)) for line, text in lines]
+
+
+class DocumentStatistics:
+    """Per-tab word, character, sentence and paragraph counts, kept per logical line.
+
+    An edit only marks the lines it touched as stale; refresh() sends them
+    to the StatisticsWorker and the totals are updated when the results
+    come back. Edits made while a request is out are logged and replayed on
+    its results, so they are never applied to lines that moved.
+    """
+
+    def __init__(self, text_widget, worker):
+        self.text_widget = text_widget
+        self.worker = worker
+        self.line_stats = []  # Stats per logical line, None while stale
+        self.stale_lines = set()  # 1-based numbers of the lines to count again
+        self.totals = [0, 0, 0, 0]
+        self.needs_full_count = True
+        self.edits_in_flight = None  # (first line, removed, added) of edits since the pending request
+        self.refresh_requested = None  # Callback of a refresh asked for while a request was out
+        text_widget.edit_listeners.append(self.on_edit)
+
+    def on_edit(self, op, start, end, text):
+        first = split_index(start)[0]
+        if op == "insert":
+            removed, added = 0, text.count("\n")
+        else:
+            removed, added = split_index(end)[0] - first, 0
+        if self.edits_in_flight is not None:
+            self.edits_in_flight.append((first, removed, added))
+        if self.needs_full_count:
+            return
+        for stats in self.line_stats[first - 1:first + removed]:
+            if stats is not None:
+                self._add(stats, -1)
+        self.line_stats[first - 1:first + removed] = [None] * (added + 1)
+
+        shift = added - removed
+        self.stale_lines = {line + shift if line > first + removed else line
+                            for line in self.stale_lines if not first < line <= first + removed}
+        self.stale_lines.update(range(first, first + added + 1))
+
+    def _add(self, stats, sign):
+        for position, value in enumerate(stats):
+            self.totals[position] += sign * value
+
+    def refresh(self, callback):
+        """Count what is stale on the worker, then call callback with the totals on the Tk thread."""
+        if self.edits_in_flight is not None:
+            self.refresh_requested = callback  # Run when the pending request is done
+            return
+        if not self.needs_full_count and not self.stale_lines:
+            callback(self.summary())
+            return
+        self.edits_in_flight = []
+        if self.needs_full_count:
+            self.worker.request(lambda result: self._apply_full(result, callback), self.worker.count_snapshot,
+                                self.text_widget.document.snapshot())
+            return
+        lines = sorted(self.stale_lines)
+        self.stale_lines.clear()
+        # One slice of the document per run of consecutive stale lines
+        pairs = []
+        run_start = previous = lines[0]
+        for line in lines[1:] + [None]:
+            if line is not None and line == previous + 1:
+                previous = line
+                continue
+            texts = self.text_widget.document.get_lines(run_start, previous).split("\n")
+            pairs.extend(zip(range(run_start, previous + 1), texts))
+            run_start = previous = line
+        self.worker.request(lambda result: self._apply_lines(result, callback), self.worker.count_lines, pairs)
+
+    def _apply_full(self, result, callback):
+        edits, self.edits_in_flight = self.edits_in_flight, None
+        if result is None:
+            self.refresh_requested = None
+            return  # Counting failed, the next refresh starts over
+        for first, removed, added in edits:
+            result[first - 1:first + removed] = [None] * (added + 1)
+        self.line_stats = result
+        self.stale_lines = {number for number, stats in enumerate(result, start=1) if stats is None}
+        self.totals = [0, 0, 0, 0]
+        for stats in result:
+            if stats is not None:
+                self._add(stats, 1)
+        self.needs_full_count = False
+        callback(self.summary())
+        self._refresh_again()
+
+    def _apply_lines(self, result, callback):
+        edits, self.edits_in_flight = self.edits_in_flight, None
+        if result is None:
+            self.needs_full_count = True  # Counting failed, the lines it took are lost
+            self.refresh_requested = None
+            return
+        for line, stats in result:
+            # Follow the line through the edits made meanwhile; lines they touched are stale again
+            for first, removed, added in edits:
+                if first <= line <= first + removed:
+                    line = None
+                    break
+                if line > first + removed:
+                    line += added - removed
+            if line is not None and self.line_stats[line - 1] is None:
+                self.line_stats[line - 1] = stats
+                self.stale_lines.discard(line)
+                self._add(stats, 1)
+        callback(self.summary())
+        self._refresh_again()
+
+    def _refresh_again(self):
+        callback, self.refresh_requested = self.refresh_requested, None
+        if callback is not None:
+            self.refresh(callback)
+
+    def summary(self):
+        """Return (words, characters, sentences, paragraphs, reading minutes)."""
+        words, characters, sentences, paragraphs = self.totals
+        return words, characters, sentences, paragraphs, math.ceil(words / WORDS_PER_MINUTE)
@@ -1,41 +1,189 @@
+import re
 import tkinter as tk
-from tkinter import font
+
+from completion import CompletionPopup
+from document import PieceTable
+from perf import timed
+from scheduler import PRIORITY_HIGH
+from typography import Typographer
+from undo_history import DEFAULT_BUDGET, DELETE, INSERT, UndoStack
+
+
+def split_index(index):
+    """Split a "line.col" text index into a (line, col) tuple of ints."""
+    line, col = index.split(".")
+    return int(line), int(col)
+
+
+def shift_lines(lines, op, start, end, text):
+    """Return the line numbers of a set after an edit, without the lines the edit touched."""
+    first = split_index(start)[0]
+    if op == "insert":
+        removed, added = 0, text.count("\n")
+    else:
+        removed, added = split_index(end)[0] - first, 0
+    shift = added - removed
+    return {line + shift if line > first + removed else line
+            for line in lines if not first <= line <= first + removed}
+
+
+WHITESPACE_RE = re.compile(r" +|\t+")
+SPELL_DELAY = 300  # Wait after the last edit or scroll before checking spelling, keeps it off the typing path
+SPELL_BATCH_LINES = 50  # Lines sent to the spellchecker per job, tagged with one call when they come back
+
 
 class TextWidget(tk.Text):
-    def __init__(self, master, spec_chars=False, **kwargs):
-        super().__init__(master, **kwargs)
+    def __init__(self, master, spec_chars=False, scheduler=None, undo_budget=DEFAULT_BUDGET, spellchecker=None,
+                 vocabulary=None, **kwargs):
+        # Watch the view so that scrolled-in lines get their special character markers
+        self.yscroll_callback = kwargs.pop("yscrollcommand", None)
+        super().__init__(master, yscrollcommand=self.on_yscroll, **kwargs)
+        self.scheduler = scheduler  # Shared IdleScheduler used to coalesce redraws
         self.special_chars = {
             ' ': '·',
             '\t': '→',
-            '\n': '¶\n'
+            '\n': '¶'
         }
-        self.display_chars = {}  # Map original positions to displayed glyphs
         self.show_special = spec_chars
-        self.undo_stack = []  # Stack for undo actions
-        self.redo_stack = []  # Stack for redo actions
-        self.quote_state = []  # Track positions of quotes for smart quote logic
-        self.bind('<KeyRelease>', self.update_display)
+        self.decorated_lines = set()  # Visible lines whose spaces and tabs are marked
+        self.newline_markers = []  # Pool of labels drawing ¶ at the visible line ends
+        self.spellchecker = spellchecker  # Shared SpellChecker, None when spelling is not checked
+        self.spelled_lines = set()  # Visible lines whose misspellings are tagged or being checked
+        self.completion = CompletionPopup(self, vocabulary) if vocabulary is not None else None
+        self.undo_stack = UndoStack(undo_budget)  # Grouped edits for undo
+        self.redo_stack = UndoStack(undo_budget)  # Groups undone and available for redo
+        self.typographer = Typographer(self)  # Smart quotes, dashes and non-breaking spaces
+        self.document = PieceTable()  # Python mirror of the text, read instead of calling get()
+        self.edit_listeners = [self.document.on_edit]  # Callbacks notified after every insert/delete, mirror first
+        self.scroll_listeners = []  # Callbacks notified when the view moves, with the visible fractions
+        self.edit_generation = 0  # Incremented on every edit, used for dirty tracking
+        self.read_only = False  # Set while a file is still being loaded into the widget
+        self.bind('<KeyRelease>', self.request_display_update)
         self.bind('<KeyPress>', self.handle_keypress)
+        self.bind('<<Paste>>', self.on_paste)
+        self.bind('<<Cut>>', self.on_cut)
         self.config(undo=False)  # Disable built-in undo to use custom stack
 
-        current_font = self.cget("font")
-        if isinstance(current_font, str) and current_font.startswith("{"):
-            self.normal_font = font.Font(self, font=current_font)
-        else:
-            self.normal_font = font.nametofont(current_font)
-
-        self.gray_font = font.Font(
-            self,
-            family=self.normal_font.cget("family"),
-            size=self.normal_font.cget("size"),
-            weight=self.normal_font.cget("weight"),
-            slant=self.normal_font.cget("slant"),
-            underline=self.normal_font.cget("underline"),
-            overstrike=self.normal_font.cget("overstrike")
-        )
+        # Route the Tcl widget command through Python so that every edit, including
+        # the ones made by Tk's own class bindings, reaches the edit listeners.
+        self._orig_command = self._w + "_orig"
+        self.tk.call("rename", self._w, self._orig_command)
+        self.tk.createcommand(self._w, self._dispatch)
+
+        self.bind('<Configure>', self.request_display_update, add="+")
+        if self.completion is not None:
+            self.bind('<Button-1>', lambda event: self.completion.hide(), add="+")
+            self.bind('<FocusOut>', lambda event: self.completion.hide(), add="+")
+        self.edit_listeners.append(self.on_edit_markers)
+        self.edit_listeners.append(self.on_edit_spelling)
+
+        # Markers are drawn with tags (spaces underlined, tabs struck through), so the document
+        # text itself never changes. Marker colours need Tk 8.6.6 or newer.
+        self.tag_configure("special_space", underline=True, underlinefg="gray")
+        self.tag_configure("special_tab", overstrike=True, overstrikefg="gray")
+        self.tag_configure("misspelled", underline=True, underlinefg="red")
+
+    def destroy(self):
+        if self.scheduler is not None:
+            self.scheduler.cancel((str(self), "display"))
+            self.scheduler.cancel((str(self), "spelling"))
+        super().destroy()
+        try:
+            self.tk.deletecommand(self._w)
+        except tk.TclError:
+            pass
+
+    def _dispatch(self, operation, *args):
+        """Forward a widget command to the real Tk widget, notifying edit listeners.
+
+        Errors of the command itself reach the caller as TclError, like with
+        an unwrapped widget; Tk's own bindings rely on them.
+        """
+        if self.read_only and operation in ("insert", "delete", "replace"):
+            return ""
+        if operation == "insert" and self.edit_listeners:
+            return self._dispatch_insert(args)
+        if operation == "delete" and self.edit_listeners:
+            return self._dispatch_delete(args)
+        if operation == "replace" and self.edit_listeners:
+            return self._dispatch_replace(args)
+        return self.tk.call((self._orig_command, operation) + args)
+
+    def _dispatch_insert(self, args):
+        start = self._resolve_index(args[0])
+        text = "".join(args[1::2])
+        result = self.tk.call((self._orig_command, "insert", start) + args[1:])
+        self._notify("insert", start, self._advance(start, text), text)
+        return result
+
+    def _dispatch_delete(self, args):
+        # Like Tk, pair the indices into ranges (a last unpaired one deletes a character), sort and merge them
+        ranges = []
+        for i in range(0, len(args), 2):
+            start = self._resolve_index(args[i])
+            end = self._resolve_index(args[i + 1] if i + 1 < len(args) else f"{start}+1c")
+            if split_index(start) < split_index(end):
+                ranges.append((split_index(start), split_index(end)))
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        # Deleted from the last range back, so the indices of the earlier ones stay valid
+        for start, end in reversed(merged):
+            start, end = "%d.%d" % start, "%d.%d" % end
+            deleted = self.tk.call(self._orig_command, "get", start, end)
+            self.tk.call(self._orig_command, "delete", start, end)
+            self._notify("delete", start, end, deleted)
+        return ""
+
+    def _dispatch_replace(self, args):
+        start = self._resolve_index(args[0])
+        end = self._resolve_index(args[1])
+        text = "".join(args[2::2])
+        deleted = self.tk.call(self._orig_command, "get", start, end)
+        result = self.tk.call((self._orig_command, "replace") + args)
+        if split_index(start) < split_index(end):
+            self._notify("delete", start, end, deleted)
+        self._notify("insert", start, self._advance(start, text), text)
+        return result
+
+    def _notify(self, op, start, end, text):
+        # text is the inserted or the deleted text; end is the end of the deleted range before the delete
+        self.edit_generation += 1
+        for listener in self.edit_listeners:
+            try:
+                listener(op, start, end, text)
+            except Exception as e:
+                print(f"Error in edit listener {getattr(listener, '__name__', listener)}: {e}")
+
+    def _resolve_index(self, index):
+        """Return index as "line.col", clamped to the last editable position."""
+        index = str(self.tk.call(self._orig_command, "index", index))
+        last = str(self.tk.call(self._orig_command, "index", "end-1c"))
+        return last if split_index(index) > split_index(last) else index
 
+    @staticmethod
+    def _advance(index, text):
+        """Return the index just after text inserted at index."""
+        line, col = split_index(index)
+        newlines = text.count("\n")
+        if newlines:
+            col = len(text) - text.rfind("\n") - 1
+            return f"{line + newlines}.{col}"
+        return f"{line}.{col + len(text)}"
+
+    @timed("keypress")
     def handle_keypress(self, event):
         """Handle keypresses and manage undo/redo for single characters."""
+        if self.read_only:
+            return None  # Tk's own bindings run, and _dispatch refuses their edits
+        if self.completion is not None:
+            if self.completion.handle_key(event):
+                return "break"
+            if event.keysym not in ('BackSpace', 'Shift_L', 'Shift_R') and not (event.char and event.char.isalpha()):
+                self.completion.hide()
         if event.char in self.special_chars or event.keysym in ('Return', 'Tab', 'space'):
             self.handle_special_char(event)
             return "break"  # Prevent default behavior
@@ -53,17 +201,32 @@ class TextWidget(tk.Text):
     def handle_insert(self, event):
         """Handle insertion of a single character with undo support."""
         sel = self.tag_ranges(tk.SEL)
-        pos = self.index(tk.INSERT)
         if sel:
             text = self.get(sel[0], sel[1])
             self.delete(sel[0], sel[1])
-            self.undo_stack.append(('delete', sel[0], sel[1], text))
+            self.undo_stack.start_group()
+            self.undo_stack.push(DELETE, str(sel[0]), text)
             self.redo_stack.clear()
+        pos = self.index(tk.INSERT)
         char = event.char
         self.insert(pos, char)
-        self.undo_stack.append(('insert', pos, char))
+        self.undo_stack.push(INSERT, pos, char, same_group=bool(sel))
+        self.redo_stack.clear()
+        self.apply_typography()
+        self.request_display_update()
+        if self.completion is not None:
+            self.completion.update()
+
+    def insert_text(self, text):
+        """Insert text at the cursor as one undo step, e.g. the rest of a completed word."""
+        pos = self.index(tk.INSERT)
+        self.insert(pos, text)
+        self.undo_stack.start_group()
+        self.undo_stack.push(INSERT, pos, text)
+        self.undo_stack.start_group()
         self.redo_stack.clear()
-        self.update_display()
+        self.see(tk.INSERT)
+        self.request_display_update()
 
     def handle_delete(self, event):
         """Handle deletion of a single character with undo support."""
@@ -71,9 +234,9 @@ class TextWidget(tk.Text):
         if sel:
             text = self.get(sel[0], sel[1])
             self.delete(sel[0], sel[1])
-            self.undo_stack.append(('delete', sel[0], sel[1], text))
+            self.undo_stack.start_group()
+            self.undo_stack.push(DELETE, str(sel[0]), text)
             self.redo_stack.clear()
-            self.update_quote_state(sel[0], sel[1])
         else:
             pos = self.index(tk.INSERT)
             if event.keysym == 'BackSpace':
@@ -81,172 +244,344 @@ class TextWidget(tk.Text):
                     prev_pos = self.index(f"{pos} - 1 char")
                     char = self.get(prev_pos, pos)
                     self.delete(prev_pos, pos)
-                    self.undo_stack.append(('delete', prev_pos, pos, char))
+                    self.undo_stack.push(DELETE, prev_pos, char)
                     self.redo_stack.clear()
-                    self.update_quote_state(prev_pos, pos)
             elif event.keysym == 'Delete':
                 end_pos = self.index(f"{pos} + 1 char")
                 if self.compare(end_pos, "<=", "end-1c"):
                     char = self.get(pos, end_pos)
                     self.delete(pos, end_pos)
-                    self.undo_stack.append(('delete', pos, end_pos, char))
+                    self.undo_stack.push(DELETE, pos, char)
                     self.redo_stack.clear()
-                    self.update_quote_state(pos, end_pos)
-        self.update_display()
+        self.request_display_update()
+        if self.completion is not None and self.completion.prefix is not None:
+            self.completion.update()  # Follow the shorter word while the list is open
 
     def handle_special_char(self, event):
         """Insert special characters and their glyphs with undo support."""
         sel = self.tag_ranges(tk.SEL)
-        pos = self.index(tk.INSERT)
         if sel:
             text = self.get(sel[0], sel[1])
             self.delete(sel[0], sel[1])
-            self.undo_stack.append(('delete', sel[0], sel[1], text))
+            self.undo_stack.start_group()
+            self.undo_stack.push(DELETE, str(sel[0]), text)
             self.redo_stack.clear()
-            self.update_quote_state(sel[0], sel[1])
+        pos = self.index(tk.INSERT)
         char = '\n' if event.keysym == 'Return' else '\t' if event.keysym == 'Tab' else event.char
         if char in self.special_chars:
-            if self.show_special:
-                display_char = self.special_chars[char]
-                self.insert(pos, display_char)
-                self.tag_add("special", pos)
-                self.display_chars[pos] = char
-                self.undo_stack.append(('insert', pos, display_char, char))
-            else:
-                self.insert(pos, char)
-                self.undo_stack.append(('insert', pos, char))
+            self.insert(pos, char)
+            self.undo_stack.push(INSERT, pos, char, same_group=bool(sel))
             self.redo_stack.clear()
+            self.apply_typography()
+        self.request_display_update()
 
     def handle_quote(self, event):
         """Handle smart quote insertion with undo support."""
         sel = self.tag_ranges(tk.SEL)
-        pos = self.index(tk.INSERT)
         if sel:
             text = self.get(sel[0], sel[1])
             self.delete(sel[0], sel[1])
-            self.undo_stack.append(('delete', sel[0], sel[1], text))
+            self.undo_stack.start_group()
+            self.undo_stack.push(DELETE, str(sel[0]), text)
             self.redo_stack.clear()
-            self.update_quote_state(sel[0], sel[1])
 
+        pos = self.index(tk.INSERT)
         # Determine if we should insert an opening or closing quote
-        quote_char = self.get_next_quote(pos)
+        quote_char = self.typographer.quote_for(pos)
         self.insert(pos, quote_char)
-        self.undo_stack.append(('insert', pos, quote_char))
+        self.typographer.mark_quote(pos)
+        self.undo_stack.push(INSERT, pos, quote_char, same_group=bool(sel))
         self.redo_stack.clear()
-        self.quote_state.append((pos, quote_char))
-        self.update_display()
-
-    def update_quote_state(self, start, end):
-        """Update quote state when text is deleted."""
-        # Remove any quote positions that fall within the deleted range
-        new_quote_state = []
-        for q_pos, q_char in self.quote_state:
-            if self.compare(q_pos, "<", start) or self.compare(q_pos, ">=", end):
-                new_quote_state.append((q_pos, q_char))
-        self.quote_state = new_quote_state
-
-    def get_next_quote(self, pos):
-        """Determine whether to insert an opening or closing quote based on context."""
-        # Count quotes before the current position
-        quote_count = sum(1 for q_pos, _ in self.quote_state if self.compare(q_pos, "<", pos))
-        # If the previous character is a space, newline, or start of text, use opening quote
-        if pos == "1.0":
-            prev_char = None
+        self.request_display_update()
+
+    def apply_typography(self):
+        """Apply the first typography rule matching the text just typed, as part of the same undo group."""
+        replacement = self.typographer.keystroke_replacement(self.index(tk.INSERT))
+        if replacement:
+            start, old_text, new_text = replacement
+            self.replace(start, f"{start}+{len(old_text)}c", new_text)
+            self.undo_stack.push(DELETE, start, old_text, same_group=True)
+            self.undo_stack.push(INSERT, start, new_text, same_group=True)
+
+    def bulk_replace(self, start, end, text, undoable=True):
+        """Replace start..end with text in one widget call, recorded as a single undo group."""
+        if self.read_only:
+            return
+        start, end = self.index(start), self.index(end)
+        old_text = self.get(start, end) if undoable and start != end else ""
+        if start == "1.0" and end == self.index("end-1c"):
+            self.typographer.clear_quote_marks()
+        if start == end:
+            self.insert(start, text)
         else:
-            prev_char = self.get(f"{pos} - 1 char")
-        if prev_char in (None, ' ', '\n', '\t'):
-            return '«'
-        # Otherwise, alternate between opening and closing quotes
-        return '»' if quote_count % 2 == 1 else '«'
+            self.replace(start, end, text)
+        self.typographer.index_quotes(start, text)
+        if undoable:
+            self.undo_stack.start_group()
+            if old_text:
+                self.undo_stack.push(DELETE, start, old_text)
+            self.undo_stack.push(INSERT, start, text, same_group=bool(old_text))
+            self.undo_stack.start_group()
+            self.redo_stack.clear()
+        self.request_display_update()
+
+    def bulk_insert(self, index, text, undoable=True):
+        """Insert a large text in one widget call, recorded as a single undo group."""
+        self.bulk_replace(index, index, text, undoable)
+
+    def append_loaded(self, text):
+        """Append a chunk of the file being loaded, which is allowed while read_only and not undoable."""
+        read_only, self.read_only = self.read_only, False
+        try:
+            self.bulk_insert("end-1c", text, undoable=False)
+        finally:
+            self.read_only = read_only
+
+    def paste_text(self, text):
+        """Insert text at the cursor as it is, replacing the selection if there is one.
 
+        Pasted text is not typeset, so commands, URLs and code keep their
+        quotes and dashes; typeset_all() does that on request.
+        """
+        start = tk.SEL_FIRST if self.tag_ranges(tk.SEL) else tk.INSERT
+        end = tk.SEL_LAST if start == tk.SEL_FIRST else tk.INSERT
+        self.bulk_replace(start, end, text)
+        self.see(tk.INSERT)
+
+    def typeset_all(self):
+        """Re-typeset the whole document in one pass, as a single undo group."""
+        text = self.document.text()
+        typeset = self.typographer.typeset(text)
+        if typeset != text:
+            cursor_pos = self.index(tk.INSERT)
+            self.bulk_replace("1.0", "end-1c", typeset)
+            self.mark_set(tk.INSERT, cursor_pos)
+
+    def set_marks(self, marks):
+        """Set many (name, index) marks with a single Tcl evaluation."""
+        if marks:
+            self.tk.eval("\n".join(f"{self._orig_command} mark set {name} {index}" for name, index in marks))
+
+    def unset_marks(self, names):
+        if names:
+            self.tk.call((self._orig_command, "mark", "unset") + tuple(names))
+
+    def delete_selection(self):
+        if self.tag_ranges(tk.SEL):
+            self.bulk_replace(tk.SEL_FIRST, tk.SEL_LAST, "")
+
+    def on_paste(self, event=None):
+        try:
+            self.paste_text(self.clipboard_get())
+        except tk.TclError:
+            pass  # Clipboard is empty or unavailable
+        return "break"
+
+    def on_cut(self, event=None):
+        if self.tag_ranges(tk.SEL):
+            self.clipboard_clear()
+            self.clipboard_append(self.get(tk.SEL_FIRST, tk.SEL_LAST))
+            self.delete_selection()
+        return "break"
+
+    def request_display_update(self, event=None):
+        """Schedule update_display, coalescing bursts of keystrokes into one redraw."""
+        if not self.show_special:
+            return
+        if self.scheduler is None:
+            self.update_display()
+        else:
+            self.scheduler.schedule((str(self), "display"), self.update_display, delay=30, max_delay=150,
+                                    priority=PRIORITY_HIGH)
+
+    def on_yscroll(self, first, last):
+        if self.yscroll_callback:
+            self.yscroll_callback(first, last)
+        for listener in self.scroll_listeners:
+            listener(first, last)
+        self.request_display_update()
+        self.request_spellcheck()
+
+    def on_edit_markers(self, op, start, end, text):
+        """Forget the markers of edited lines; they are redrawn on the next display update."""
+        if not self.show_special:
+            return
+        if op == "insert":
+            # Inserted text inherits the tags around it, strip them right away
+            self.tag_remove("special_space", start, end)
+            self.tag_remove("special_tab", start, end)
+        self.decorated_lines = shift_lines(self.decorated_lines, op, start, end, text)
+
+    def on_edit_spelling(self, op, start, end, text):
+        """Check the edited lines again once typing pauses."""
+        if self.spellchecker is None:
+            return
+        self.spelled_lines = shift_lines(self.spelled_lines, op, start, end, text)
+        self.request_spellcheck()
+
+    def request_spellcheck(self):
+        if self.spellchecker is None:
+            return
+        if self.scheduler is None:
+            self.update_spelling()
+        else:
+            self.scheduler.schedule((str(self), "spelling"), self.update_spelling, delay=SPELL_DELAY)
+
+    def update_spelling(self):
+        """Send the visible lines that are not checked yet to the spellchecker, in batches."""
+        if self.spellchecker is None:
+            return
+        first = split_index(self.index("@0,0"))[0]
+        last = split_index(self.index(f"@0,{self.winfo_height()}"))[0]
+        # Lines out of view are checked again when they come back, from the spellchecker's cache
+        self.spelled_lines = {line for line in self.spelled_lines if first <= line <= last}
+        pending = [line for line in range(first, last + 1) if line not in self.spelled_lines]
+        if not pending:
+            return
+        texts = self.document.get_lines(pending[0], pending[-1]).split("\n")
+        generation = self.edit_generation
+        for position in range(0, len(pending), SPELL_BATCH_LINES):
+            batch = pending[position:position + SPELL_BATCH_LINES]
+            self.spelled_lines.update(batch)
+            self.spellchecker.check([(line, texts[line - pending[0]]) for line in batch],
+                                    lambda spans, batch=batch: self.apply_spelling(generation, batch, spans))
+
+    def apply_spelling(self, generation, lines, spans):
+        """Tag the misspellings of a batch of lines, unless the text changed since it was sent."""
+        if not self.winfo_exists() or self.spellchecker is None:
+            return
+        if generation != self.edit_generation:
+            self.spelled_lines.difference_update(lines)
+            self.request_spellcheck()
+            return
+        # One tag_remove per run of consecutive lines and one tag_add for the whole batch
+        run_start = previous = lines[0]
+        for line in lines[1:] + [None]:
+            if line is not None and line == previous + 1:
+                previous = line
+                continue
+            self.tag_remove("misspelled", f"{run_start}.0", f"{previous}.end")
+            run_start = previous = line
+        if spans:
+            self.tag_add("misspelled", *(f"{line}.{col}" for line, start, end in spans for col in (start, end)))
+
+    def set_spellchecker(self, spellchecker):
+        self.spellchecker = spellchecker
+        self.spelled_lines.clear()
+        if spellchecker is None:
+            self.tag_remove("misspelled", "1.0", "end")
+        else:
+            self.request_spellcheck()
+
+    @timed("update_display")
     def update_display(self, event=None):
-        """Update display to show special character glyphs if enabled."""
+        """Draw special character markers on the lines in the viewport."""
         if not self.show_special:
             return  # Skip update if special chars are not shown
 
-        # Save cursor position and selection
-        cursor_pos = self.index(tk.INSERT)
-        sel = self.tag_ranges(tk.SEL)
-        sel_start, sel_end = (self.index(sel[0]), self.index(sel[1])) if sel else (None, None)
-
-        # Get all text
-        content = self.get("1.0", tk.END)[:-1]  # Exclude trailing newline
-        self.delete("1.0", tk.END)  # Clear text widget
-        self.display_chars.clear()  # Clear mapping
-
-        # Re-insert text with glyphs
-        for i, char in enumerate(content, start=1):
-            line, col = divmod(i-1, len(content.split('\n')[0]) + 1)
-            pos = f"{line+1}.{col}"
-            if char in self.special_chars:
-                self.insert(pos, self.special_chars[char])
-                self.tag_add("special", pos)
-                self.display_chars[pos] = char
-            else:
-                self.insert(pos, char)
-            # Handle newline explicitly
-            if char == '\n' and i < len(content):
-                self.insert(pos, '\n')
+        first = split_index(self.index("@0,0"))[0]
+        last = split_index(self.index(f"@0,{self.winfo_height()}"))[0]
 
-        # Apply gray color to special characters
-        self.tag_configure("special", foreground="gray", font=self.gray_font)
+        # Lines that scrolled out of view drop their markers
+        if any(line < first or line > last for line in self.decorated_lines):
+            for tag in ("special_space", "special_tab"):
+                self.tag_remove(tag, "1.0", f"{first}.0")
+                self.tag_remove(tag, f"{last + 1}.0", "end")
+            self.decorated_lines = {line for line in self.decorated_lines if first <= line <= last}
 
-        # Restore cursor and selection
-        self.mark_set(tk.INSERT, cursor_pos)
-        if sel_start and sel_end:
-            self.tag_add(tk.SEL, sel_start, sel_end)
+        # Mark spaces and tabs on the lines that changed or scrolled into view; lines
+        # between the first and last pending one are simply marked again
+        spaces, tabs = [], []
+        pending = [line for line in range(first, last + 1) if line not in self.decorated_lines]
+        if pending:
+            self.tag_remove("special_space", f"{pending[0]}.0", f"{pending[-1]}.end")
+            self.tag_remove("special_tab", f"{pending[0]}.0", f"{pending[-1]}.end")
+            texts = self.document.get_lines(pending[0], pending[-1]).split("\n")
+            for line, text in enumerate(texts, start=pending[0]):
+                for match in WHITESPACE_RE.finditer(text):
+                    ranges = spaces if match.group()[0] == " " else tabs
+                    ranges.extend((f"{line}.{match.start()}", f"{line}.{match.end()}"))
+                self.decorated_lines.add(line)
+        if spaces:
+            self.tag_add("special_space", *spaces)
+        if tabs:
+            self.tag_add("special_tab", *tabs)
+
+        self.place_newline_markers(first, last)
+
+    def place_newline_markers(self, first, last):
+        """Place a ¶ label after the end of every visible line except the last one."""
+        last_line = split_index(self.index("end-1c"))[0]
+        marker_font = self.cget("font")
+        used = 0
+        for line in range(first, min(last, last_line - 1) + 1):
+            bbox = self.bbox(f"{line}.end")
+            if not bbox:
+                continue
+            if used == len(self.newline_markers):
+                marker = tk.Label(self, text=self.special_chars['\n'], fg="gray", bd=0, padx=0, pady=0,
+                                  highlightthickness=0, cursor="xterm")
+                marker.bind("<Button-1>", self.on_newline_marker_click)
+                self.newline_markers.append(marker)
+            marker = self.newline_markers[used]
+            marker.configure(font=marker_font, bg=self.cget("bg"))
+            marker.line = line
+            marker.place(x=bbox[0], y=bbox[1])
+            used += 1
+        for marker in self.newline_markers[used:]:
+            marker.place_forget()
+
+    def on_newline_marker_click(self, event):
+        self.mark_set(tk.INSERT, f"{event.widget.line}.end")
+        self.tag_remove(tk.SEL, "1.0", "end")
+        self.focus_set()
+
+    def clear_markers(self):
+        self.tag_remove("special_space", "1.0", "end")
+        self.tag_remove("special_tab", "1.0", "end")
+        self.decorated_lines.clear()
+        for marker in self.newline_markers:
+            marker.place_forget()
 
     def toggle_spec_chars(self, show):
-        """Toggle special character display and update content."""
+        """Toggle special character markers; only the visible lines are touched."""
         self.show_special = show
-        cursor_pos = self.index(tk.INSERT)
-        content = self.get("1.0", tk.END)[:-1]
-        if self.show_special:
-            content = content.replace(' ', '·')
-            content = content.replace('\t', '→')
-            content = content.replace('\n', '¶\n')
+        if show:
+            self.update_display()
         else:
-            content = content.replace('·', ' ')
-            content = content.replace('→', '\t')
-            content = content.replace('¶', '')
-        self.delete("1.0", tk.END)
-        self.insert("1.0", content)
-
-        self.mark_set(tk.INSERT, cursor_pos)
-        self.see(cursor_pos)
+            self.clear_markers()
 
+    @timed("undo")
     def undo(self):
-        """Undo the last single-character action."""
-        if not self.undo_stack:
+        """Undo the last group of edits."""
+        records = self.undo_stack.pop_group()
+        if not records:
             return
-        action = self.undo_stack.pop()
-        if action[0] == 'insert':
-            pos, char = action[1], action[2]
-            self.delete(pos, f"{pos}+{len(char)}c")
-            self.redo_stack.append(('insert', pos, char))
-            if char in ('«', '»'):
-                self.quote_state = [(q_pos, q_char) for q_pos, q_char in self.quote_state if q_pos != pos]
-        elif action[0] == 'delete':
-            start, end, text = action[1], action[2], action[3]
-            self.insert(start, text)
-            self.redo_stack.append(('delete', start, end, text))
-            self.update_quote_state(start, end)
-        self.update_display()
+        self.apply_records(records, undo=True)
+        self.redo_stack.push_group(records)
+        self.request_display_update()
 
+    @timed("redo")
     def redo(self):
-        """Redo the last undone single-character action."""
-        if not self.redo_stack:
+        """Redo the last undone group of edits."""
+        records = self.redo_stack.pop_group()
+        if not records:
             return
-        action = self.redo_stack.pop()
-        if action[0] == 'insert':
-            pos, char = action[1], action[2]
-            self.insert(pos, char)
-            self.undo_stack.append(('insert', pos, char))
-            if char in ('«', '»'):
-                self.quote_state.append((pos, char))
-        elif action[0] == 'delete':
-            start, end, text = action[1], action[2], action[3]
-            self.delete(start, end)
-            self.undo_stack.append(('delete', start, end, text))
-            self.update_quote_state(start, end)
-        self.update_display()
\ No newline at end of file
+        self.apply_records(records, undo=False)
+        self.undo_stack.push_group(records)
+        self.request_display_update()
+
+    def apply_records(self, records, undo):
+        """Revert (undo=True) or re-apply a group of undo records and move the cursor there."""
+        # Runs of edits next to each other, like a replaced selection, become one widget call each
+        for pos, old, new in coalesce_records(records, undo):
+            if not old:
+                self.insert(pos, new)
+            elif not new:
+                self.delete(pos, f"{pos}+{len(old)}c")
+            else:
+                self.replace(pos, f"{pos}+{len(old)}c", new)
+            if new:
+                self.typographer.index_quotes(pos, new)
+            self.mark_set(tk.INSERT, f"{pos}+{len(new)}c")
+        self.see(tk.INSERT)
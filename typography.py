@@ -0,0 +1,127 @@
+import re
+from itertools import count
+
+NBSP = "\u00a0"
+OPEN_QUOTE = "«"
+CLOSE_QUOTE = "»"
+QUOTE_MARK_PREFIX = "quote"
+RULE_LOOKBEHIND = 16  # Characters before the cursor that keystroke rules look at
+
+# Characters after which a straight quote opens a quotation
+OPENING_CONTEXT = " \t\n(«" + NBSP
+# One-letter Belarusian words that should not be left at the end of a line
+SHORT_WORDS = "аіоуўзАІОУЎЗ"
+
+# Keystroke rules, matched against the text just before the cursor after every typed character
+KEYSTROKE_RULES = [
+    (re.compile(r"\.\.\.$"), "…"),
+    (re.compile(r"(?<=\S) +(?:--|-|—) $"), NBSP + "— "),
+    (re.compile(r"--$"), "—"),
+    (re.compile(rf"(?<![^\s(«{NBSP}])([{SHORT_WORDS}]) $"), r"\1" + NBSP),
+]
+
+# The same rules for re-typesetting a whole text in one pass
+TYPESET_RE = re.compile(
+    r'(?P<quote>["«»])'
+    r"|(?P<dash>(?<=\S) +(?:--|-|—) +)"
+    r"|(?P<emdash>--)"
+    r"|(?P<ellipsis>\.\.\.)"
+    rf"|(?<![^\s(«{NBSP}])(?P<letter>[{SHORT_WORDS}]) (?=\S)"
+)
+QUOTE_RE = re.compile("[«»]")
+
+
+class Typographer:
+    """Smart typography for a TextWidget: «» quotes, dashes, ellipses and non-breaking spaces.
+
+    Every « and » in the widget carries a Tk mark, which moves with the text,
+    so finding whether the cursor is inside a quotation only walks the marks
+    back to the nearest quote. Marks left behind by deleted quotes are dropped
+    when they are met.
+    """
+
+    def __init__(self, text_widget):
+        self.text_widget = text_widget
+        self.mark_ids = count()
+
+    def quote_for(self, pos):
+        """Return the quote to insert for a straight quote typed at pos."""
+        prev_char = self.text_widget.get(f"{pos} - 1 char") if pos != "1.0" else None
+        if not prev_char or prev_char in OPENING_CONTEXT:
+            return OPEN_QUOTE
+        return CLOSE_QUOTE if self.is_open_before(pos) else OPEN_QUOTE
+
+    def is_open_before(self, pos):
+        """Return True if the nearest quote before pos opens a quotation."""
+        widget = self.text_widget
+        name = widget.mark_previous(pos)
+        while name:
+            next_name = widget.mark_previous(name)
+            if name.startswith(QUOTE_MARK_PREFIX):
+                char = widget.get(name)
+                if char in (OPEN_QUOTE, CLOSE_QUOTE):
+                    return char == OPEN_QUOTE
+                widget.mark_unset(name)  # The quote was deleted
+            name = next_name
+        return False
+
+    def mark_quote(self, pos):
+        self.text_widget.mark_set(f"{QUOTE_MARK_PREFIX}{next(self.mark_ids)}", pos)
+
+    def index_quotes(self, start, text):
+        """Mark every quote of text, which was just inserted at start."""
+        if OPEN_QUOTE not in text and CLOSE_QUOTE not in text:
+            return
+        first_line, first_col = map(int, start.split("."))
+        marks = []
+        for line_offset, line in enumerate(text.split("\n")):
+            col_offset = first_col if line_offset == 0 else 0
+            for match in QUOTE_RE.finditer(line):
+                marks.append((f"{QUOTE_MARK_PREFIX}{next(self.mark_ids)}",
+                              f"{first_line + line_offset}.{col_offset + match.start()}"))
+        self.text_widget.set_marks(marks)
+
+    def clear_quote_marks(self):
+        self.text_widget.unset_marks([name for name in self.text_widget.mark_names()
+                                      if str(name).startswith(QUOTE_MARK_PREFIX)])
+
+    def keystroke_replacement(self, pos):
+        """Return (start, old, new) for the first keystroke rule matching the text before pos, or None."""
+        line, col = map(int, pos.split("."))
+        tail_col = max(col - RULE_LOOKBEHIND, 0)
+        tail = self.text_widget.get(f"{line}.{tail_col}", pos)
+        for pattern, replacement in KEYSTROKE_RULES:
+            match = pattern.search(tail)
+            # A match at the start of a cut-off tail cannot see what precedes it
+            if match and (match.start() > 0 or tail_col == 0):
+                return f"{line}.{tail_col + match.start()}", match.group(), match.expand(replacement)
+        return None
+
+    @staticmethod
+    def typeset(text, open_quote=False):
+        """Apply all typography rules to text in one linear pass.
+
+        open_quote tells whether the text starts inside a quotation.
+        """
+        depth = 1 if open_quote else 0  # Nesting level of quotations
+
+        def substitute(match):
+            nonlocal depth
+            kind = match.lastgroup
+            if kind == "quote":
+                quote = match.group()
+                if quote == '"':
+                    prev_char = text[match.start() - 1] if match.start() else None
+                    opens = not prev_char or prev_char in OPENING_CONTEXT or not depth
+                    quote = OPEN_QUOTE if opens else CLOSE_QUOTE
+                depth = depth + 1 if quote == OPEN_QUOTE else max(depth - 1, 0)
+                return quote
+            if kind == "dash":
+                return NBSP + "— "
+            if kind == "emdash":
+                return "—"
+            if kind == "ellipsis":
+                return "…"
+            return match.group("letter") + NBSP
+
+        return TYPESET_RE.sub(substitute, text)
@@ -0,0 +1,197 @@
+import time
+from array import array
+
+INSERT = 0
+DELETE = 1
+
+GROUP_TIMEOUT = 1.0  # Seconds of inactivity that close a typing group
+RECORD_OVERHEAD = 64  # Approximate bytes of bookkeeping per record
+DEFAULT_BUDGET = 16 * 1024 * 1024
+
+
+def _end_of(line, col, text):
+    """Return the (line, col) just after text placed at line.col."""
+    newlines = text.count("\n")
+    if newlines:
+        return line + newlines, len(text) - text.rfind("\n") - 1
+    return line, col + len(text)
+
+
+def _offset_in(line, col, text, pos):
+    """Return the offset in text, placed at line.col, of the (line, col) pos, or None if pos is outside it."""
+    if pos < (line, col):
+        return None
+    line_start = 0
+    for _ in range(pos[0] - line):
+        line_start = text.find("\n", line_start) + 1
+        if not line_start:
+            return None
+        col = 0
+    line_end = text.find("\n", line_start)
+    offset = line_start + pos[1] - col
+    return offset if offset <= (len(text) if line_end < 0 else line_end) else None
+
+
+def coalesce_records(records, undo):
+    """Turn a group of undo records into as few (pos, old, new) replacements as possible.
+
+    Every run of records touching the span changed by the previous ones is
+    folded into a single replacement of old by new at the "line.col" position
+    pos. The replacements are applied one after the other; those reverting
+    the group (undo=True) are the ones re-applying it, backwards.
+    """
+    spans = []  # [line, col, old, new]
+    for kind, pos, text in records:
+        line, col = map(int, pos.split("."))
+        span = spans[-1] if spans else None
+        if span and kind == INSERT:
+            offset = _offset_in(span[0], span[1], span[3], (line, col))
+            if offset is not None:
+                span[3] = span[3][:offset] + text + span[3][offset:]
+                continue
+        elif span:
+            # A deletion may also take text next to the span, which is still the text before the group
+            before = _offset_in(line, col, text, (span[0], span[1]))
+            if before is not None:
+                span[2] = text[:before] + span[2]
+                span[0], span[1] = line, col
+                text, offset = text[before:], 0
+            else:
+                offset = _offset_in(span[0], span[1], span[3], (line, col))
+            if offset is not None:
+                taken = min(len(text), len(span[3]) - offset)
+                span[2] += text[taken:]
+                span[3] = span[3][:offset] + span[3][offset + taken:]
+                continue
+        spans.append([line, col, "", text] if kind == INSERT else [line, col, text, ""])
+    if undo:
+        return [(f"{line}.{col}", new, old) for line, col, old, new in reversed(spans)]
+    return [(f"{line}.{col}", old, new) for line, col, old, new in spans]
+
+
+class UndoStack:
+    """Memory-bounded stack of edit groups stored in parallel arrays.
+
+    Each record is an insert or delete of a text at a line/col position.
+    Consecutive typing and deleting is merged into a single record, and
+    records are grouped by word and by pauses in typing so that one undo
+    reverts one group. When the approximate size exceeds max_bytes the
+    oldest groups are dropped.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_BUDGET):
+        self.max_bytes = max_bytes
+        self.kinds = array("b")
+        self.lines = array("l")
+        self.cols = array("l")
+        self.texts = []
+        self.group_starts = array("l")  # Index of the first record of every group
+        self.size = 0
+        self.last_push = 0.0
+        self.force_new_group = False
+
+    def __len__(self):
+        return len(self.group_starts)
+
+    def clear(self):
+        del self.kinds[:], self.lines[:], self.cols[:], self.texts[:], self.group_starts[:]
+        self.size = 0
+
+    def start_group(self):
+        """Make the next push open a new group."""
+        self.force_new_group = True
+
+    def push(self, kind, pos, text, same_group=False):
+        """Record an edit at the "line.col" position pos, merging it with the previous one if possible."""
+        if not text:
+            return
+        line, col = map(int, str(pos).split("."))
+        now = time.monotonic()
+        has_group = bool(self.group_starts) and not self.force_new_group
+        if same_group and has_group:
+            if not self._merge(kind, line, col, text):
+                self._append(kind, line, col, text)
+        elif (has_group and now - self.last_push < GROUP_TIMEOUT
+              and not self._is_word_boundary(kind, text) and self._merge(kind, line, col, text)):
+            pass
+        else:
+            self.group_starts.append(len(self.kinds))
+            self._append(kind, line, col, text)
+        self.force_new_group = False
+        self.last_push = now
+        self._enforce_budget()
+
+    def pop_group(self):
+        """Remove the newest group and return its records as (kind, "line.col", text) tuples."""
+        if not self.group_starts:
+            return []
+        start = self.group_starts.pop()
+        records = [(self.kinds[i], f"{self.lines[i]}.{self.cols[i]}", self.texts[i])
+                   for i in range(start, len(self.kinds))]
+        self.size -= sum(RECORD_OVERHEAD + len(text) for _, _, text in records)
+        del self.kinds[start:], self.lines[start:], self.cols[start:], self.texts[start:]
+        self.force_new_group = True
+        return records
+
+    def push_group(self, records):
+        """Push records popped from another stack as one group, without merging."""
+        if not records:
+            return
+        self.group_starts.append(len(self.kinds))
+        for kind, pos, text in records:
+            line, col = map(int, pos.split("."))
+            self._append(kind, line, col, text)
+        self.force_new_group = True
+        self._enforce_budget()
+
+    def _append(self, kind, line, col, text):
+        self.kinds.append(kind)
+        self.lines.append(line)
+        self.cols.append(col)
+        self.texts.append(text)
+        self.size += RECORD_OVERHEAD + len(text)
+
+    def _is_word_boundary(self, kind, text):
+        # A new word typed after whitespace starts a new group
+        last_text = self.texts[-1]
+        return (kind == INSERT and self.kinds[-1] == INSERT
+                and last_text[-1].isspace() and not text[0].isspace())
+
+    def _merge(self, kind, line, col, text):
+        """Extend the last record with a contiguous edit of the same kind."""
+        if not self.kinds or self.kinds[-1] != kind or len(self.kinds) == self.group_starts[-1]:
+            return False
+        last_line, last_col, last_text = self.lines[-1], self.cols[-1], self.texts[-1]
+        if kind == INSERT:
+            if (line, col) != _end_of(last_line, last_col, last_text):
+                return False
+            self.texts[-1] = last_text + text
+        elif (line, col) == (last_line, last_col):
+            # Forward delete at the same position
+            self.texts[-1] = last_text + text
+        elif _end_of(line, col, text) == (last_line, last_col):
+            # Backspace just before the previous deletion
+            self.texts[-1] = text + last_text
+            self.lines[-1], self.cols[-1] = line, col
+        else:
+            return False
+        self.size += len(text)
+        return True
+
+    def _enforce_budget(self):
+        if self.size <= self.max_bytes or len(self.group_starts) < 2:
+            return
+        # Drop the oldest groups down to 3/4 of the budget so that eviction is not done per keystroke
+        target = self.max_bytes * 3 // 4
+        groups = 0
+        dropped = 0
+        while groups < len(self.group_starts) - 1 and self.size - dropped > target:
+            first, end = self.group_starts[groups], self.group_starts[groups + 1]
+            dropped += sum(RECORD_OVERHEAD + len(self.texts[i]) for i in range(first, end))
+            groups += 1
+        records = self.group_starts[groups]
+        del self.kinds[:records], self.lines[:records], self.cols[:records], self.texts[:records]
+        del self.group_starts[:groups]
+        for i in range(len(self.group_starts)):
+            self.group_starts[i] -= records
+        self.size -= dropped